@@ -0,0 +1,30 @@
+"""add token_version to users
+
+Revision ID: 5c1e7d2a9b41
+Revises: 2375ab89c783
+Create Date: 2026-10-18 17:01:49.695706
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7d2a9b41'
+down_revision: Union[str, Sequence[str], None] = '2375ab89c783'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # batch mode, sqlite cannot drop a column in place
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,34 @@
+"""add login throttle columns to users
+
+Revision ID: b6e3f9a2d514
+Revises: f2d8a1c6e493
+Create Date: 2026-10-18 17:40:12.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e3f9a2d514'
+down_revision: Union[str, Sequence[str], None] = 'f2d8a1c6e493'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('failed_login_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('last_failed_login_at', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.add_column('users', sa.Column('locked_until', sa.TIMESTAMP(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # not in batch mode: copying the table on sqlite would lose the lower() expression
+    # indexes, which it cannot reflect. Needs sqlite 3.35+ for DROP COLUMN.
+    op.drop_column('users', 'locked_until')
+    op.drop_column('users', 'last_failed_login_at')
+    op.drop_column('users', 'failed_login_count')
@@ -0,0 +1,31 @@
+"""rename revoked_tokens.username to revoked_by
+
+Revision ID: d4a7c2e9f130
+Revises: b6e3f9a2d514
+Create Date: 2026-10-18 18:05:41.527310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7c2e9f130'
+down_revision: Union[str, Sequence[str], None] = 'b6e3f9a2d514'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # the column held the owner on logout but the admin on /admin/revoke, it is who revoked the token
+    with op.batch_alter_table('revoked_tokens') as batch_op:
+        batch_op.alter_column('username', new_column_name='revoked_by', existing_type=sa.String(), existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('revoked_tokens') as batch_op:
+        batch_op.alter_column('revoked_by', new_column_name='username', existing_type=sa.String(), existing_nullable=False)
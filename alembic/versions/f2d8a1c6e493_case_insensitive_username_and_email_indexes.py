@@ -0,0 +1,32 @@
+"""case-insensitive username and email indexes
+
+Revision ID: f2d8a1c6e493
+Revises: e19a6d4c0b58
+Create Date: 2026-10-18 17:12:45.669727
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d8a1c6e493'
+down_revision: Union[str, Sequence[str], None] = 'e19a6d4c0b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # written by hand, autogenerate cannot compare expression indexes on sqlite.
+    # Fails if existing rows differ only by case, those have to be merged first.
+    op.create_index('ix_users_username_lower', 'users', [sa.text('lower(username)')], unique=True)
+    op.create_index('ix_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_users_email_lower', table_name='users')
+    op.drop_index('ix_users_username_lower', table_name='users')
@@ -0,0 +1,105 @@
+"""Cold start: import time of the app and time to the first successful login.
+
+import:      `import main` in a fresh interpreter, median of --runs
+first login: a fresh uvicorn process is started, then
+             startup      until it accepts connections (includes the lifespan warm-up)
+             first login  latency of the first POST /login
+             second login latency of the next one, for reference
+             total        process start to first successful login
+             with STARTUP_WARMUP off and on.
+
+Usage: python benchmarks/bench_cold_start.py [--runs 5] [--bcrypt-rounds N] [--async-db] [--output cold_start.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from bench_endpoints import SRC, PASSWORD, configure_env, free_port, seed
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+
+
+def import_time() -> float:
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=SRC, env=os.environ.copy(),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def first_login(warmup: bool) -> dict:
+    port = free_port()
+    env = {**os.environ, "STARTUP_WARMUP": "true" if warmup else "false"}
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SRC, env=env
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60) as client:
+            while True:
+                try:
+                    client.get("/health")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("uvicorn exited")
+                    time.sleep(0.005)
+            listening = time.perf_counter()
+
+            timings = []
+            for _ in range(2):
+                request_start = time.perf_counter()
+                response = client.post("/login", data={"username": "bench0", "password": PASSWORD})
+                response.raise_for_status()
+                timings.append(time.perf_counter() - request_start)
+            return {
+                "startup_ms": (listening - start) * 1000,
+                "first_login_ms": timings[0] * 1000,
+                "second_login_ms": timings[1] * 1000,
+                "total_ms": (listening - start + timings[0]) * 1000,
+            }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def median_of(runs: list[dict]) -> dict:
+    return {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--bcrypt-rounds", type=int, help="defaults to BCRYPT_ROUNDS from the settings")
+    parser.add_argument("--async-db", action="store_true")
+    parser.add_argument("--output", type=Path, default=Path("cold_start.json"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_env(Path(tmp) / "bench.db", args)
+        # keeps login free of the default per-IP budget and of other scenarios
+        os.environ["RATE_LIMIT_ENABLED"] = "false"
+        seed(1)
+
+        report = {"import_ms": round(statistics.median(import_time() for _ in range(args.runs)) * 1000, 1)}
+        print(f"import main: {report['import_ms']:.1f} ms (median of {args.runs})")
+
+        print(f"{'warmup':<8}{'startup ms':>12}{'first login':>13}{'second login':>14}{'total ms':>10}")
+        for warmup in (False, True):
+            stats = median_of([first_login(warmup) for _ in range(args.runs)])
+            report[f"warmup_{'on' if warmup else 'off'}"] = stats
+            print(f"{'on' if warmup else 'off':<8}{stats['startup_ms']:>12.1f}{stats['first_login_ms']:>13.1f}"
+                  f"{stats['second_login_ms']:>14.1f}{stats['total_ms']:>10.1f}")
+
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
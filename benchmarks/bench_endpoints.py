@@ -0,0 +1,304 @@
+"""Throughput and latency of the auth endpoints against a seeded temp database.
+
+Every scenario runs `--requests` requests with `--concurrency` clients, either
+in-process through httpx's ASGI transport (no network, measures the app) or
+over a local uvicorn server (adds HTTP parsing and the socket). Results go to
+a JSON file; pass an earlier one as --baseline to diff two commits.
+
+Usage: python benchmarks/bench_endpoints.py [--mode asgi|http|both] [--requests 200] [--concurrency 16]
+                                            [--users 500] [--scenarios login,protected,...]
+                                            [--bcrypt-rounds N] [--async-db] [--workers N]
+                                            [--output bench_endpoints.json] [--baseline old.json] [--fail-over 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC))
+
+PASSWORD = "bench-password"
+SCENARIOS = ["protected", "all_users", "2fa_enable", "2fa_qr", "2fa_verify", "login", "register", "signup_login"]
+
+
+def configure_env(db_path: Path, args):
+    # must happen before the app modules are imported, Config is read once
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["DB_ASYNC"] = "true" if args.async_db else "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    os.environ["RATE_LIMIT_STORAGE"] = "memory://"
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ.setdefault("JWT_SECRET_KEY", "bench-jwt-secret-key-of-at-least-32-bytes")
+    os.environ.setdefault("JWT_ALGO", "HS256")
+    os.environ.setdefault("TOKEN_SECRET_KEY", "bench-token-secret")
+    os.environ.setdefault("FRONTEND_URL", "http://localhost:3000")
+    os.environ.setdefault("SMTP_EMAIL", "noreply@example.com")
+    os.environ.setdefault("SMTP_PASSWORD", "password")
+    os.environ.setdefault("SMTP_HOST", "localhost")
+    os.environ.setdefault("SMTP_PORT", "2525")
+
+
+def seed(users: int) -> dict:
+    """Verified users with a pending 2fa secret each, returns their tokens and secrets."""
+    import pyotp
+    from sqlalchemy import insert, select
+    from database.database import Base, engine, sessionLocal
+    from models.models import User, UserTOTP
+    from auth.utils import hash_password
+    from routers.auth_routes import _user_access_token
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    hashed = hash_password(PASSWORD)  # current policy, logins never trigger a rehash
+    with sessionLocal() as db:
+        db.execute(insert(User), [
+            {"username": f"bench{i}", "email": f"bench{i}@example.com", "password": hashed, "is_verified": True}
+            for i in range(users)
+        ])
+        seeded = db.scalars(select(User).order_by(User.id)).all()
+        secrets = [pyotp.random_base32() for _ in seeded]
+        db.execute(insert(UserTOTP), [
+            {"user_id": user.id, "secret_key": secret} for user, secret in zip(seeded, secrets)
+        ])
+        db.commit()
+        tokens = [_user_access_token(user) for user in seeded]
+    return {"tokens": tokens, "secrets": secrets}
+
+
+def requests_for(data: dict, run_id: str) -> dict:
+    """scenario -> (expected statuses, async function sending request i)"""
+    import pyotp
+    tokens, secrets = data["tokens"], data["secrets"]
+    users = len(tokens)
+
+    def auth(i: int) -> dict:
+        return {"Authorization": f"Bearer {tokens[i % users]}"}
+
+    def login(c, i):
+        return c.post("/login", data={"username": f"bench{i % users}", "password": PASSWORD})
+
+    def register(c, i, prefix="new"):
+        name = f"{prefix}{run_id}x{i}"
+        return c.post("/register/", json={"username": name, "email": f"{name}@example.com", "password": PASSWORD})
+
+    return {
+        "protected": ({200}, lambda c, i: c.get("/protected", headers=auth(i))),
+        "all_users": ({200}, lambda c, i: c.get("/all_users", params={"limit": 50}, headers=auth(i))),
+        "2fa_enable": ({200}, lambda c, i: c.post("/2fa/enable", headers=auth(i))),
+        "2fa_qr": ({200}, lambda c, i: c.get("/2fa/qr", headers=auth(i))),
+        # enables 2fa for good, so every request needs a user of its own
+        "2fa_verify": ({200}, lambda c, i: c.post("/2fa/verify", headers=auth(i), json={"totp_code": pyotp.TOTP(secrets[i]).now()})),
+        "login": ({200}, login),
+        "register": ({201}, register),
+        # concurrent writers, registrations interleaved with logins (which write a refresh token)
+        "signup_login": ({200, 201}, lambda c, i: register(c, i, "mix") if i % 2 else login(c, i)),
+    }
+
+
+async def run_scenario(client, send, expected: set[int], total: int, warmup: int, concurrency: int) -> dict:
+    latencies, errors = [], 0
+    counter = iter(range(warmup + total))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            response = await send(client, i)
+            duration = time.perf_counter() - start
+            if i < warmup:
+                continue
+            latencies.append(duration)
+            if response.status_code not in expected:
+                errors += 1
+
+    # warmup requests go through the same workers, they are just not recorded
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, errors, elapsed)
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def run_all(client, scenarios: list[str], data: dict, args, run_id: str) -> dict:
+    requests = requests_for(data, run_id)
+    results = {}
+    for name in scenarios:
+        expected, send = requests[name]
+        total = args.requests
+        if name == "2fa_verify":
+            total = min(total, len(data["tokens"]) - args.warmup)
+        results[name] = await run_scenario(client, send, expected, total, args.warmup, args.concurrency)
+        print(format_row(name, results[name]), file=sys.stderr)
+    return results
+
+
+async def bench_asgi(scenarios: list[str], data: dict, args) -> dict:
+    import httpx
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_all(client, scenarios, data, args, "asgi")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def bench_http(scenarios: list[str], data: dict, args) -> dict:
+    import httpx
+
+    port = free_port()
+    if args.workers:
+        # the production launcher, pre-forked workers
+        command = ["-m", "cli.serve", "--workers", str(args.workers), "--log-level", "warning"]
+    else:
+        command = ["-m", "uvicorn", "main:app", "--log-level", "warning"]
+    server = subprocess.Popen(
+        [sys.executable, *command, "--host", "127.0.0.1", "--port", str(port)], cwd=SRC, env=os.environ.copy()
+    )
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            for _ in range(100):
+                try:
+                    await client.get("/health")
+                    break
+                except httpx.TransportError:
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("uvicorn did not start")
+            return await run_all(client, scenarios, data, args, "http")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def format_row(name: str, stats: dict) -> str:
+    return (f"  {name:<12}{stats['rps']:>9.1f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=SRC, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, fail_over: float | None) -> bool:
+    """Prints the change per scenario, returns False when a p95 regressed more than fail_over percent."""
+    ok = True
+    print(f"\nvs {baseline['meta'].get('commit')}  (change in %, positive p95 is slower)")
+    # numbers from different hardware or settings are not comparable
+    for key in ("cpus", "concurrency", "db_async", "password_scheme", "bcrypt_rounds", "workers"):
+        if baseline["meta"].get(key) != current["meta"][key]:
+            print(f"  warning: {key} differs, {baseline['meta'].get(key)} vs {current['meta'][key]}")
+    print(f"  {'scenario':<18}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for mode, results in current["results"].items():
+        for name, stats in results.items():
+            old = baseline["results"].get(mode, {}).get(name)
+            if not old:
+                continue
+            delta = {key: (stats[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+                     for key in ("rps", "p50_ms", "p95_ms", "p99_ms")}
+            regressed = fail_over is not None and delta["p95_ms"] > fail_over
+            ok = ok and not regressed
+            print(f"  {mode + '/' + name:<18}{delta['rps']:>+9.1f}{delta['p50_ms']:>+9.1f}"
+                  f"{delta['p95_ms']:>+9.1f}{delta['p99_ms']:>+9.1f}{'  REGRESSED' if regressed else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["asgi", "http", "both"], default="asgi")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--bcrypt-rounds", type=int, help="defaults to BCRYPT_ROUNDS from the settings")
+    parser.add_argument("--async-db", action="store_true", help="run with DB_ASYNC=true")
+    parser.add_argument("--workers", type=int, default=0, help="http mode: serve with python -m cli.serve and this many workers")
+    parser.add_argument("--output", type=Path, default=Path("bench_endpoints.json"))
+    parser.add_argument("--baseline", type=Path, help="results of an earlier run to compare with")
+    parser.add_argument("--fail-over", type=float, help="exit with 1 when a p95 is this many percent slower than the baseline")
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {', '.join(sorted(unknown))}")
+    modes = ["asgi", "http"] if args.mode == "both" else [args.mode]
+    if "2fa_verify" in scenarios and args.users < args.warmup + 2:
+        parser.error("2fa_verify needs more --users than --warmup")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_env(Path(tmp) / "bench.db", args)
+        for mode in modes:
+            # reseeded per mode, 2fa_verify and register change the data
+            data = seed(args.users)
+            print(f"{mode}: {args.concurrency} clients, {args.requests} requests per scenario", file=sys.stderr)
+            print(f"  {'scenario':<12}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}", file=sys.stderr)
+            runner = bench_asgi if mode == "asgi" else bench_http
+            results[mode] = asyncio.run(runner(scenarios, data, args))
+
+    from config import Config
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "users": args.users,
+            "db_async": args.async_db,
+            "password_scheme": Config.PASSWORD_SCHEME,
+            "bcrypt_rounds": Config.BCRYPT_ROUNDS,
+            "sqlite_journal_mode": Config.SQLITE_JOURNAL_MODE,
+            "sqlite_synchronous": Config.SQLITE_SYNCHRONOUS,
+            "db_pool_size": Config.DB_POOL_SIZE,
+            "workers": args.workers,
+        },
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"results written to {args.output}", file=sys.stderr)
+
+    if args.baseline and not compare(json.loads(args.baseline.read_text()), report, args.fail_over):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Login throughput of password verification, before and after the hashing pool.
+
+before: verify_password in a 40 thread pool (the starlette default)
+after:  PasswordHasher process pool with 1..N workers
+
+Usage: python benchmarks/bench_hashing.py [--logins 64] [--max-workers 8]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from auth.utils import hash_password, verify_password
+from auth.hashing import PasswordHasher
+
+
+async def run_threadpool(hashed: str, logins: int) -> float:
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            loop.run_in_executor(pool, verify_password, "password123", hashed) for _ in range(logins)
+        ])
+        return time.perf_counter() - start
+
+
+async def run_process_pool(hashed: str, logins: int, workers: int) -> float:
+    # budget is disabled here, we want raw throughput not rejections
+    hasher = PasswordHasher(workers=workers, max_pending=logins, latency_budget_ms=10**9)
+    await hasher.verify("password123", hashed)  # spawn the workers outside the timing
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*[hasher.verify("password123", hashed) for _ in range(logins)])
+        return time.perf_counter() - start
+    finally:
+        hasher.shutdown()
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    hashed = hash_password("password123")
+
+    print(f"{'mode':<22}{'workers':>8}{'seconds':>10}{'logins/s':>10}")
+    elapsed = await run_threadpool(hashed, args.logins)
+    print(f"{'threadpool (before)':<22}{40:>8}{elapsed:>10.2f}{args.logins / elapsed:>10.1f}")
+
+    workers = 1
+    while workers <= args.max_workers:
+        elapsed = await run_process_pool(hashed, args.logins, workers)
+        print(f"{'process pool (after)':<22}{workers:>8}{elapsed:>10.2f}{args.logins / elapsed:>10.1f}")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+"""Per request overhead of the rate limiter backends.
+
+Usage: python benchmarks/bench_ratelimit.py [--hits 20000] [--redis redis://localhost:6379/0]
+
+One run with --hits 20000 on a single core dev container: memory 1.6 us,
+sqlite 16.3 us per hit. The sqlite statements run inline on the event loop.
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.ratelimit import MemoryBackend, SQLiteBackend, RedisBackend, RateLimiter
+
+
+async def measure(limiter: RateLimiter, hits: int, keys: int = 1000) -> float:
+    start = time.perf_counter()
+    for i in range(hits):
+        await limiter.hit(f"bench:{i % keys}", "1000000/minute")
+    return (time.perf_counter() - start) / hits * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hits", type=int, default=20000)
+    parser.add_argument("--redis", help="also measure a redis backend at this url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": MemoryBackend(),
+            "sqlite": SQLiteBackend(str(Path(tmp) / "ratelimit.db")),
+        }
+        if args.redis:
+            backends["redis"] = RedisBackend(args.redis)
+
+        print(f"{'backend':<10}{'us/request':>12}")
+        for name, backend in backends.items():
+            print(f"{name:<10}{await measure(RateLimiter(backend), args.hits):>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""Response serialization cost per schema, old path vs new path.
+
+encoder:  jsonable_encoder + json.dumps, what JSONResponse does for a route without a response_model
+pydantic: validate into the schema then dump_json (TypeAdapter), what FastAPI does for a response_model
+new:      what the app does now, rows straight to bytes for /all_users, orjson for plain dicts
+
+Usage: python benchmarks/bench_serialization.py [--rows 100] [--seconds 1]
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine, insert, select
+from starlette.responses import JSONResponse
+
+from database.database import Base
+from models.models import User
+from routers.auth_routes import USER_RESPONSE_COLUMNS
+from schemas.schemas import Token, UserCreateResponse, user_list_adapter
+from schemas.serialization import FastJSONResponse, dump_user_rows, orjson
+
+
+def user_rows(count: int):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    start = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "password": "x", "is_verified": i % 2 == 0,
+             "role": "user", "created_at": start + timedelta(seconds=i, microseconds=i)}
+            for i in range(count)
+        ])
+        return conn.execute(select(*USER_RESPONSE_COLUMNS).order_by(User.id)).all()
+
+
+def json_dumps(content) -> bytes:
+    return JSONResponse(None).render(jsonable_encoder(content))
+
+
+def orjson_dumps(content) -> bytes:
+    return FastJSONResponse(None).render(jsonable_encoder(content))
+
+
+def pydantic(adapter: TypeAdapter):
+    return lambda content: adapter.dump_json(adapter.validate_python(content, from_attributes=True))
+
+
+def per_call_us(func, content, seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(10):
+            func(content)
+        calls += 10
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100, help="users per /all_users page")
+    parser.add_argument("--seconds", type=float, default=1.0, help="per measurement")
+    args = parser.parse_args()
+
+    rows = user_rows(args.rows)
+    user = rows[0]._asdict()
+    cases = {
+        f"UserResponse x{args.rows}": (rows, {
+            "encoder": lambda rows: json_dumps([row._asdict() for row in rows]), "pydantic": pydantic(user_list_adapter), "new": dump_user_rows}),
+        "UserCreateResponse": ({"message": "created", "data": user}, {
+            "encoder": json_dumps, "pydantic": pydantic(TypeAdapter(UserCreateResponse)),
+            "new": pydantic(TypeAdapter(UserCreateResponse))}),
+        "Token": ({"access_token": "x" * 300, "token_type": "bearer", "refresh_token": "y" * 43}, {
+            "encoder": json_dumps, "pydantic": pydantic(TypeAdapter(Token)), "new": pydantic(TypeAdapter(Token))}),
+        "message dict": ({"message": "Logged out successfully"}, {
+            "encoder": json_dumps, "new": orjson_dumps}),
+    }
+
+    print(f"orjson: {'yes' if orjson is not None else 'no, stdlib json fallback'}")
+    print(f"{'schema':<24}{'path':<10}{'us/call':>10}{'vs encoder':>12}")
+    for name, (content, paths) in cases.items():
+        outputs = {path: json.loads(func(content)) for path, func in paths.items()}
+        assert all(output == outputs["encoder"] for output in outputs.values()), f"{name}: outputs differ"
+        baseline = None
+        for path, func in paths.items():
+            us = per_call_us(func, content, args.seconds)
+            baseline = baseline or us
+            print(f"{name:<24}{path:<10}{us:>10.2f}{baseline / us:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
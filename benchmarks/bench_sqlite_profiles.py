@@ -0,0 +1,59 @@
+"""Concurrent login and register throughput under each SQLite engine profile.
+
+Runs bench_endpoints.py once per profile, with the SQLITE_* / DB_POOL_* settings
+of the profile in the environment, and prints the results side by side.
+
+default:  what sqlite does without pragmas (rollback journal, synchronous=FULL)
+wal_full: WAL journal, still fsync on every commit
+tuned:    the Settings defaults (WAL, synchronous=NORMAL, mmap, 64 MiB cache)
+
+Usage: python benchmarks/bench_sqlite_profiles.py [--output sqlite_profiles.json] [bench_endpoints.py options...]
+e.g.   python benchmarks/bench_sqlite_profiles.py --concurrency 32 --requests 400 --bcrypt-rounds 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BENCH = Path(__file__).resolve().parent / "bench_endpoints.py"
+
+PROFILES = {
+    "default": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE": "-2000"},
+    "wal_full": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "FULL", "SQLITE_MMAP_SIZE": "0", "SQLITE_CACHE_SIZE": "-2000"},
+    "tuned": {},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output", type=Path, default=Path("sqlite_profiles.json"))
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    args, bench_args = parser.parse_known_args()
+    if "--scenarios" not in bench_args:
+        bench_args += ["--scenarios", "signup_login,login,register"]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.profiles.split(","):
+            output = Path(tmp) / f"{name}.json"
+            print(f"profile {name}", file=sys.stderr)
+            subprocess.run(
+                [sys.executable, str(BENCH), *bench_args, "--output", str(output)],
+                env={**os.environ, **PROFILES[name]}, check=True
+            )
+            results[name] = json.loads(output.read_text())
+
+    print(f"\n{'profile':<10}{'scenario':<20}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, report in results.items():
+        for mode, scenarios in report["results"].items():
+            for scenario, stats in scenarios.items():
+                print(f"{name:<10}{mode + '/' + scenario:<20}{stats['rps']:>9.1f}{stats['p50_ms']:>10.2f}"
+                      f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['errors']:>8}")
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from config import Config
+from auth.utils import hash_password, verify_password, verify_and_update_password, pwd_context
+from services.metrics import crypto_time, hash_queue_time
+
+# bcrypt is CPU bound, running it in the starlette threadpool blocks a thread for
+# every login. The hasher pushes it into a separate process pool and refuses new
+# work with a 503 when the queue would take longer than the latency budget.
+
+def _timed_call(func, *args):
+    # runs inside the worker process, returns the result and the pure hashing time
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _load_backend() -> int:
+    # passlib loads the hash backend on first use, in every worker process
+    pwd_context.handler().get_backend()
+    return os.getpid()
+
+
+class PasswordHasher:
+
+    def __init__(self, workers: int = 0, max_pending: int = 64, latency_budget_ms: int = 2000):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.latency_budget = latency_budget_ms / 1000
+        self.avg_duration = 0.25  # seconds, moving average of one bcrypt job
+        self.pending = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def estimated_wait(self) -> float:
+        # jobs already queued are spread over all workers, plus our own job
+        return (self.pending // self.workers + 1) * self.avg_duration
+
+    def _admit(self):
+        wait = self.estimated_wait()
+        if self.pending >= self.max_pending or wait > self.latency_budget:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+    async def _run(self, func, *args):
+        self._admit()
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, duration = await loop.run_in_executor(self.executor, _timed_call, func, *args)
+        finally:
+            self.pending -= 1
+        self.avg_duration = 0.8 * self.avg_duration + 0.2 * duration
+        crypto_time.observe(duration, func.__name__)
+        hash_queue_time.observe(max(time.perf_counter() - start - duration, 0.0))
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+    async def warm_up(self):
+        """Starts the worker processes and loads the hash backend in them, before the first login."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, _load_backend) for _ in range(self.workers)])
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=Config.HASH_POOL_WORKERS,
+    max_pending=Config.HASH_MAX_PENDING,
+    latency_budget_ms=Config.HASH_LATENCY_BUDGET_MS
+)
@@ -1,11 +1,19 @@
 from fastapi import HTTPException, status
 from datetime import datetime, timezone, timedelta
 from config import Config
+from auth.cache import TTLCache
+from auth.keys import key_ring
+from services.metrics import crypto_time
+import hashlib
 import jwt
 import uuid
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# sha256 of the raw token -> decoded payload. Clients reuse a token for its whole
+# life, so the signature check only has to run once per token and worker.
+token_cache = TTLCache(maxsize=Config.TOKEN_CACHE_SIZE, ttl=Config.TOKEN_CACHE_TTL)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     jti = str(uuid.uuid4()) # unique identifier
@@ -17,18 +25,38 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
-    token = jwt.encode(payload=to_encode, key=Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGO)
+    kid, signing_key = key_ring.signing_key()
+    token = jwt.encode(
+        payload=to_encode,
+        key=signing_key,
+        algorithm=Config.JWT_ALGO,
+        headers={"kid": kid} if kid else None
+    )
 
     return token
 
+@crypto_time.time("decode_token")
 def decode_token(token: str) -> dict:
+    cache_key = hashlib.sha256(token.encode()).digest()
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        return dict(cached)
+
     try:
+        # kid picks the key, the algorithm is pinned by config and never taken from the header
+        kid = jwt.get_unverified_header(token).get("kid")
+        verification_key = key_ring.verification_key(kid)
+        if verification_key is None:
+            raise jwt.InvalidTokenError(f"unknown kid {kid!r}")
+
         token_data = jwt.decode(
             token,
-            Config.JWT_SECRET_KEY,
+            verification_key,
             algorithms=[Config.JWT_ALGO]
         )
-        return token_data
+        # evicted at exp, an expired token is never served from the cache
+        token_cache.set(cache_key, token_data, expires_at=token_data.get("exp"))
+        return dict(token_data)
     
     except jwt.PyJWTError as e:
         raise HTTPException(
@@ -0,0 +1,89 @@
+import json
+import hashlib
+from pathlib import Path
+import jwt
+from cryptography.hazmat.primitives import serialization
+from config import Config
+
+# HMAC algorithms sign with the shared JWT_SECRET_KEY, everything else uses the key ring
+HMAC_ALGORITHMS = {"HS256", "HS384", "HS512"}
+
+
+class KeyRing:
+    """Signing and verification keys for access tokens.
+
+    For RS*/ES*/PS*/EdDSA the keys are read from JWT_KEYS_DIR, the file name is the kid:
+      <kid>.pem      private key, can sign and verify
+      <kid>.pub.pem  public key only, verifies tokens signed by a retired key
+
+    Tokens are signed with JWT_ACTIVE_KID (or the newest private key) and carry
+    its kid in the header. Rotation: add the new key, publish it through the
+    jwks endpoint, switch JWT_ACTIVE_KID, and keep the old key as <kid>.pub.pem
+    until the last token it signed has expired.
+    """
+
+    def __init__(self, algorithm: str, secret: str, keys_dir: str | None = None, active_kid: str | None = None):
+        self.algorithm = algorithm
+        self.secret = secret
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.private_keys: dict = {}
+        self.public_keys: dict = {}
+        self.jwks_body = b'{"keys":[]}'
+        self.jwks_etag = ""
+        if self.is_asymmetric:
+            self.reload()
+
+    @property
+    def is_asymmetric(self) -> bool:
+        return self.algorithm not in HMAC_ALGORITHMS
+
+    def reload(self):
+        if not self.keys_dir:
+            raise RuntimeError(f"JWT_KEYS_DIR must be set to use {self.algorithm}")
+
+        private_keys, public_keys, newest = {}, {}, {}
+        for path in Path(self.keys_dir).glob("*.pem"):
+            if path.name.endswith(".pub.pem"):
+                kid = path.name[:-len(".pub.pem")]
+                public_keys[kid] = serialization.load_pem_public_key(path.read_bytes())
+            else:
+                kid = path.stem
+                private_keys[kid] = serialization.load_pem_private_key(path.read_bytes(), password=None)
+                public_keys[kid] = private_keys[kid].public_key()
+                newest[kid] = path.stat().st_mtime
+
+        active_kid = self.active_kid or max(newest, key=newest.get, default=None)
+        if active_kid not in private_keys:
+            raise RuntimeError(f"No private key for kid {active_kid!r} in {self.keys_dir}")
+
+        self.private_keys, self.public_keys = private_keys, public_keys
+        self.signing_kid = active_kid
+
+        # the document only changes on reload, so it is rendered once
+        algorithm = jwt.get_algorithm_by_name(self.algorithm)
+        keys = []
+        for kid, public_key in sorted(public_keys.items()):
+            jwk = algorithm.to_jwk(public_key, as_dict=True)
+            jwk.update({"kid": kid, "alg": self.algorithm, "use": "sig"})
+            keys.append(jwk)
+        self.jwks_body = json.dumps({"keys": keys}, separators=(",", ":")).encode()
+        self.jwks_etag = '"' + hashlib.sha256(self.jwks_body).hexdigest()[:32] + '"'
+
+    def signing_key(self) -> tuple[str | None, object]:
+        if not self.is_asymmetric:
+            return None, self.secret
+        return self.signing_kid, self.private_keys[self.signing_kid]
+
+    def verification_key(self, kid: str | None):
+        if not self.is_asymmetric:
+            return self.secret
+        return self.public_keys.get(kid)
+
+
+key_ring = KeyRing(
+    algorithm=Config.JWT_ALGO,
+    secret=Config.JWT_SECRET_KEY,
+    keys_dir=Config.JWT_KEYS_DIR,
+    active_kid=Config.JWT_ACTIVE_KID
+)
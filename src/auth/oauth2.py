@@ -1,16 +1,32 @@
-from fastapi import Depends, status, HTTPException
+from fastapi import Depends, Request, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
 import jwt
 from auth.jwt import decode_token
+from auth.revocation import revocation_store
 from models.models import User
-from schemas.schemas import TokenData
-from database.database import get_db
+from schemas.schemas import TokenData, UserPrincipal
+from database.database import get_async_db
+from database.replicas import read_session
+from auth.cache import TTLCache
+from config import Config
 from typing import Annotated, List
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+# username -> UserPrincipal, lets warm requests skip the user lookup entirely
+principal_cache = TTLCache(maxsize=Config.PRINCIPAL_CACHE_SIZE, ttl=Config.PRINCIPAL_CACHE_TTL)
+
+@event.listens_for(User.role, "set")
+def _invalidate_on_role_change(target, value, oldvalue, initiator):
+    # any role change, wherever it is made, must not be served from a stale snapshot
+    if target.username is not None:
+        principal_cache.invalidate(target.username)
+
+# async def, decoding is pure cpu so there is no reason to borrow a threadpool thread
+async def get_current_user(token: str = Depends(oauth2_scheme)):
 
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -25,28 +41,87 @@ def get_current_user(token: str = Depends(oauth2_scheme)):
 
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username)
+        # dict lookup against the in-memory mirror, no db query on the hot path
+        if revocation_store.is_revoked(payload.get("jti")):
+            raise credentials_exception
+        token_data = TokenData(
+            username=username,
+            role=payload.get("role"),
+            is_verified=payload.get("verified"),
+            token_version=payload.get("token_version"),
+            jti=payload.get("jti"),
+            exp=payload.get("exp"),
+            sid=payload.get("sid")
+        )
         return token_data
-    
+
     except jwt.PyJWTError:
         raise credentials_exception
 
+# read session for the caller's own data, on a replica unless they changed it a moment ago
+async def get_user_read_db(request: Request, current_user: TokenData = Depends(get_current_user)):
+    async for db in read_session(request, current_user.username):
+        yield db
+
 # So this is a dependency on the above function
-def get_current_active_user(current_user: TokenData = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == current_user.username).first()
+async def get_current_active_user(current_user: TokenData = Depends(get_current_user), db: AsyncSession = Depends(get_user_read_db)) -> UserPrincipal:
+    principal = principal_cache.get(current_user.username)
+    if principal is None:
+        user = await db.scalar(select(User).where(User.username == current_user.username))
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
+        principal = UserPrincipal.model_validate(user)
+        principal_cache.set(principal.username, principal)
+    _check_principal(current_user, principal)
+    return principal
+
+def _check_principal(current_user: TokenData, principal: UserPrincipal):
+    if current_user.token_version is not None and current_user.token_version != principal.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    if principal.is_verified != True:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not verified")
+
+TOTP_LOADERS = {"joined": joinedload, "selectin": selectinload}
+
+# The 2fa routes need the ORM user together with its totp_config. The relationship
+# is eager loaded in the same lookup, lazy loading it would be one more query
+# (and is not possible at all on an AsyncSession).
+async def get_current_user_with_totp(current_user: TokenData = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)) -> User:
+    loader = TOTP_LOADERS[Config.TOTP_EAGER_LOAD]
+    user = await db.scalar(select(User).options(loader(User.totp_config)).where(User.username == current_user.username))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="user not found")
-    if user.is_verified != True:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not verified")
+    # the row is fresh anyway, keep the snapshot for the other routes warm
+    principal = UserPrincipal.model_validate(user)
+    principal_cache.set(principal.username, principal)
+    _check_principal(current_user, principal)
     return user
 
+# Stateless mode, authorize from the signed role/verified claims instead of the user row.
+# Tokens minted before the claims existed, and endpoints that need the user id,
+# still go through get_current_active_user.
+async def get_current_principal(current_user: TokenData = Depends(get_current_user), db: AsyncSession = Depends(get_user_read_db)) -> TokenData | UserPrincipal:
+    principal = await get_current_active_user(current_user=current_user, db=db)
+    if not Config.AUTH_STATELESS or current_user.role is None or current_user.is_verified is None:
+        return principal
+    # the token_version claim is never trusted on its own: it was checked above against
+    # the cached snapshot, or the row itself when this worker has none, otherwise a
+    # worker that never saw the user would accept tokens revoked by a version bump
+    if current_user.is_verified != True:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not verified")
+    return current_user
+
 class RoleChecker:
     def __init__(self, allowed_roles: List[str]):
         self.allowed_roles = allowed_roles
 
-    def __call__(self, user: Annotated[User, Depends(get_current_active_user)]):
+    async def __call__(self, user: Annotated[TokenData | UserPrincipal, Depends(get_current_principal)]):
         if user.role in self.allowed_roles:
             return user
-        else: 
+        else:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You don't have enough permissions")
-        
\ No newline at end of file
+
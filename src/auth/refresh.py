@@ -0,0 +1,85 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timezone, timedelta
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from models.models import RefreshToken, User
+from config import Config
+
+# Opaque refresh tokens, only their sha256 is stored. Every refresh rotates the
+# token, presenting an already rotated token means it was stolen, so the whole
+# family (every token descended from the same login) is revoked.
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _invalid_refresh_token():
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+def issue_refresh_token(db, user_id: int, family_id: str | None = None) -> str:
+    # only adds the row, the caller commits
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        user_id=user_id,
+        token_hash=_hash(token),
+        family_id=family_id or str(uuid.uuid4()),
+        expires_at=datetime.now(timezone.utc) + timedelta(days=Config.REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    return token
+
+async def rotate_refresh_token(db, token: str) -> tuple[User, str, str]:
+    # returns the user, the new token and its family id. Single indexed lookup on token_hash, the user comes along in the same query
+    row = (await db.execute(
+        select(RefreshToken, User)
+        .join(User, User.id == RefreshToken.user_id)
+        .where(RefreshToken.token_hash == _hash(token))
+    )).first()
+    if row is None:
+        _invalid_refresh_token()
+    refresh_token, user = row
+
+    now = datetime.now(timezone.utc)
+    if refresh_token.revoked_at is not None:
+        await revoke_family(db, refresh_token.family_id)
+        await db.commit()
+        _invalid_refresh_token()
+
+    expires_at = refresh_token.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    if expires_at <= now or user.is_verified != True:
+        _invalid_refresh_token()
+
+    # conditional update, of two concurrent refreshes with the same token only one wins
+    result = await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == refresh_token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    if result.rowcount != 1:
+        await db.rollback()
+        _invalid_refresh_token()
+
+    new_token = issue_refresh_token(db, user.id, family_id=refresh_token.family_id)
+    await db.commit()
+    return user, new_token, refresh_token.family_id
+
+async def revoke_family(db, family_id: str):
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
+
+async def revoke_user_refresh_tokens(db, user_id: int):
+    # used when every session of a user must end (password reset, admin revoke)
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(timezone.utc))
+    )
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from starlette.concurrency import run_in_threadpool
+from database.database import sessionLocal
+from models.models import RevokedToken
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp(value: datetime) -> float:
+    # sqlite hands back naive datetimes, they are stored in utc
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RevocationStore:
+    """In-memory mirror of the revoked_tokens table, jti -> exp timestamp.
+
+    get_current_user only does a dict lookup, the database is read by the
+    background sync loop. Entries are dropped once the token has expired
+    because decode_token rejects it on its own from then on, so memory is
+    bounded by the tokens revoked within one token lifetime.
+    """
+
+    def __init__(self, sync_interval: float = 5):
+        self.sync_interval = sync_interval
+        self._revoked: dict[str, float] = {}
+
+    def is_revoked(self, jti: str | None) -> bool:
+        return jti is not None and jti in self._revoked
+
+    def add(self, jti: str, expires_at: float):
+        self._revoked[jti] = expires_at
+
+    def sweep(self):
+        now = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+    def __len__(self):
+        return len(self._revoked)
+
+    async def revoke(self, db, jti: str, revoked_by: str, expires_at: float):
+        if self.is_revoked(jti):
+            return
+        existing = await db.get(RevokedToken, jti)
+        if existing is None:
+            db.add(RevokedToken(
+                jti=jti,
+                revoked_by=revoked_by,
+                expires_at=datetime.fromtimestamp(expires_at, tz=timezone.utc)
+            ))
+            await db.commit()
+        self.add(jti, expires_at)
+
+    def sync(self):
+        # picks up revocations made by other workers and purges expired rows
+        now = datetime.now(timezone.utc)
+        db = sessionLocal()
+        try:
+            db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            db.commit()
+            rows = db.execute(select(RevokedToken.jti, RevokedToken.expires_at)).all()
+        finally:
+            db.close()
+        for jti, expires_at in rows:
+            self.add(jti, _timestamp(expires_at))
+        self.sweep()
+
+    async def run_sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await run_in_threadpool(self.sync)
+            except Exception:
+                # a failed sync only delays revocations from other workers, keep serving
+                logger.exception("revocation sync failed")
+
+
+revocation_store = RevocationStore(sync_interval=Config.REVOCATION_SYNC_SECONDS)
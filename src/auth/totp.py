@@ -1,31 +1,67 @@
+import hashlib
 import io
 import pyotp
 from pyotp import TOTP
-import qrcode
+from auth.cache import TTLCache
+from services.metrics import crypto_time
+
+QR_MEDIA_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
 
 class TwoFactorAuth():
 
     @staticmethod
     def generate_secret_key() -> str:
         return pyotp.random_base32()
-    
+
     @staticmethod
     def verify_totp_code(totp_code: str, secret: str) -> bool:
         totp = TOTP(secret)
         return totp.verify(totp_code, valid_window=1) # allow timedrift +- 30s
-    
+
     @staticmethod
-    def generate_qr_code(username: str, secret: str, issuer_name="Hammad 2FA") -> bytes:
-
-        totp = pyotp.TOTP(secret)
-        # generate uri for qrcode
-        uri = totp.provisioning_uri(
-            name=username,
-            issuer_name=issuer_name
-        )
-        
+    def generate_qr_code(username: str, secret: str, issuer_name="Hammad 2FA", image_format: str = "png") -> bytes:
+        # the image only depends on these arguments, re-requests of a pending secret are served from memory
+        key = _qr_cache_key(username, secret, issuer_name, image_format)
+        qr_code = qr_cache.get(key)
+        if qr_code is None:
+            qr_code = _render_qr_code(username, secret, issuer_name, image_format)
+            qr_cache.set(key, qr_code)
+        return qr_code
+
+    @staticmethod
+    def forget_qr_codes(username: str, secret: str, issuer_name="Hammad 2FA"):
+        # the image encodes the secret, once it is confirmed nothing may keep it around
+        for image_format in QR_MEDIA_TYPES:
+            qr_cache.invalidate(_qr_cache_key(username, secret, issuer_name, image_format))
+
+
+# Rendered images of pending secrets. The key only holds a digest of the secret, and
+# entries live no longer than the clients' own copy (Cache-Control max-age of GET /2fa/qr).
+qr_cache = TTLCache(maxsize=1024, ttl=300)
+
+
+def _qr_cache_key(username: str, secret: str, issuer_name: str, image_format: str) -> tuple:
+    return username, hashlib.sha256(secret.encode()).hexdigest(), issuer_name, image_format
+
+
+@crypto_time.time("generate_qr_code")
+def _render_qr_code(username: str, secret: str, issuer_name: str, image_format: str) -> bytes:
+    # qrcode pulls in Pillow, imported on the first render instead of at startup
+    import qrcode
+    from qrcode.image.svg import SvgPathImage
+
+    totp = pyotp.TOTP(secret)
+    # generate uri for qrcode
+    uri = totp.provisioning_uri(
+        name=username,
+        issuer_name=issuer_name
+    )
+
+    img_byte_arr = io.BytesIO()
+    if image_format == "svg":
+        # plain xml, no Pillow encoding involved
+        qrcode.make(uri, image_factory=SvgPathImage).save(img_byte_arr)
+    else:
         qr_code = qrcode.make(uri) #img
-        img_byte_arr = io.BytesIO()
         qr_code.save(img_byte_arr, format="PNG")
-        img_byte_arr.seek(0)
-        return img_byte_arr.getvalue()
\ No newline at end of file
+    return img_byte_arr.getvalue()
@@ -4,10 +4,19 @@ from itsdangerous import URLSafeTimedSerializer, TimestampSigner, SignatureExpir
 from pydantic import EmailStr
 from config import Config
 
-schemes = ["bcrypt"]
+# the configured scheme hashes, the other one is still accepted but marked deprecated
+schemes = ["bcrypt", "argon2"]
 SECRET_KEY = Config.TOKEN_SECRET_KEY
 
-pwd_context = CryptContext(schemes=schemes, deprecated="auto")
+pwd_context = CryptContext(
+    schemes=schemes,
+    default=Config.PASSWORD_SCHEME,
+    deprecated="auto",
+    bcrypt__rounds=Config.BCRYPT_ROUNDS,
+    argon2__time_cost=Config.ARGON2_TIME_COST,
+    argon2__memory_cost=Config.ARGON2_MEMORY_COST,
+    argon2__parallelism=Config.ARGON2_PARALLELISM
+)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password[:72])
@@ -15,6 +24,10 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password, hashed_password) -> tuple[bool, str | None]:
+    # the second value is a new hash when the stored one does not match the current policy
+    return pwd_context.verify_and_update(plain_password[:72], hashed_password)
+
 # email verification 
 token_algo = URLSafeTimedSerializer(secret_key=SECRET_KEY, salt="email-verification")
 
@@ -0,0 +1,92 @@
+"""Picks the password hash cost for this host.
+
+Usage (from src/): python -m cli.calibrate_hashing [--target-ms 250] [--scheme bcrypt|argon2]
+                                                   [--memory-kib 65536] [--parallelism 4]
+
+Measures the hash time for increasing cost settings and prints the most
+expensive setting whose median stays under the target, as lines for the .env
+file. Run it on the hardware the API is deployed to. Verifying costs the same
+as hashing, so the target is the CPU time of one login. Existing hashes are
+upgraded on the next login after the setting changes.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from passlib.hash import bcrypt, argon2
+from passlib.exc import MissingBackendError
+
+
+def measure(handler, samples: int) -> float:
+    durations = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        handler.hash("calibration-password")
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def report(setting: str, duration: float):
+    # one hash keeps one core busy, so a core does 1 / duration logins per second
+    cores = os.cpu_count() or 1
+    print(f"  {setting:<14} {duration * 1000:8.1f} ms   ~{cores / duration:7.1f} logins/s on {cores} cores", file=sys.stderr)
+
+
+def calibrate_bcrypt(target: float, samples: int) -> list[str]:
+    chosen = None
+    for rounds in range(4, 32):
+        duration = measure(bcrypt.using(rounds=rounds), samples)
+        report(f"rounds={rounds}", duration)
+        if duration > target:
+            break
+        chosen = rounds
+    if chosen is None:
+        sys.exit("even the minimum of 4 rounds is over the target")
+    return ["PASSWORD_SCHEME=bcrypt", f"BCRYPT_ROUNDS={chosen}"]
+
+
+def calibrate_argon2(target: float, samples: int, memory_kib: int, parallelism: int) -> list[str]:
+    # memory and lanes are fixed by the deployment, the time cost is tuned
+    chosen = None
+    for time_cost in range(1, 64):
+        handler = argon2.using(time_cost=time_cost, memory_cost=memory_kib, parallelism=parallelism)
+        try:
+            duration = measure(handler, samples)
+        except MissingBackendError:
+            sys.exit("argon2 needs the argon2-cffi package")
+        report(f"time_cost={time_cost}", duration)
+        if duration > target:
+            break
+        chosen = time_cost
+    if chosen is None:
+        sys.exit(f"time_cost=1 with {memory_kib} KiB is over the target, lower --memory-kib")
+    return [
+        "PASSWORD_SCHEME=argon2",
+        f"ARGON2_TIME_COST={chosen}",
+        f"ARGON2_MEMORY_COST={memory_kib}",
+        f"ARGON2_PARALLELISM={parallelism}"
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure password hash cost settings on this host")
+    parser.add_argument("--target-ms", type=float, default=250, help="latency budget of one hash")
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default="bcrypt")
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--memory-kib", type=int, default=65536)
+    parser.add_argument("--parallelism", type=int, default=4)
+    args = parser.parse_args()
+
+    target = args.target_ms / 1000
+    print(f"{args.scheme}, target {args.target_ms:g} ms per hash", file=sys.stderr)
+    if args.scheme == "bcrypt":
+        settings = calibrate_bcrypt(target, args.samples)
+    else:
+        settings = calibrate_argon2(target, args.samples, args.memory_kib, args.parallelism)
+    print("\n".join(settings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Bulk user import from CSV or JSONL.
+
+Usage (from src/):
+    python -m cli.import_users users.csv [--batch-size 1000] [--workers N]
+                                         [--verified | --send-verification] [--duplicates dup.csv]
+
+Each record has username, email and either password (plain text, hashed here)
+or password_hash (an existing bcrypt hash, stored as is), optionally role.
+Records are streamed, so the file size does not matter. Per batch: duplicates
+are dropped (within the batch and against the database) before any hashing,
+the remaining passwords are hashed across a process pool and the batch is
+inserted with one executemany in one transaction.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy import select, insert, func
+from sqlalchemy.exc import IntegrityError
+
+from database.database import sessionLocal
+from models.models import User
+from auth.utils import hash_password, generate_token, pwd_context
+from auth.hashing import PasswordHasher
+from services.outbox import enqueue_email
+from config import Config
+
+email_adapter = TypeAdapter(EmailStr)
+
+
+def read_records(path: Path, file_format: str):
+    with path.open(newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def batches(iterable, size: int):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def validate(record: dict) -> tuple[dict | None, str | None]:
+    username = (record.get("username") or "").strip()
+    if not username:
+        return None, "missing username"
+    try:
+        email = email_adapter.validate_python((record.get("email") or "").strip())
+    except ValidationError:
+        return None, "invalid email"
+
+    password_hash = record.get("password_hash")
+    if password_hash:
+        if pwd_context.identify(password_hash) != "bcrypt":
+            return None, "password_hash is not a bcrypt hash"
+    elif not record.get("password"):
+        return None, "missing password"
+
+    return {
+        "username": username,
+        "email": email,
+        "password": password_hash or None,
+        "plain_password": None if password_hash else record["password"],
+        "role": record.get("role") or "user",
+    }, None
+
+
+def existing_keys(db, users: list[dict]) -> tuple[set, set]:
+    # one query per column, both hit the lower() unique indexes
+    usernames = [u["username"].lower() for u in users]
+    emails = [u["email"].lower() for u in users]
+    taken_usernames = set(db.scalars(select(func.lower(User.username)).where(func.lower(User.username).in_(usernames))))
+    taken_emails = set(db.scalars(select(func.lower(User.email)).where(func.lower(User.email).in_(emails))))
+    return taken_usernames, taken_emails
+
+
+def insert_users(db, users: list[dict], send_verification: bool):
+    db.execute(insert(User), users)
+    if send_verification:
+        for user in users:
+            link = f"{Config.FRONTEND_URL}/verify-email/?token={generate_token(user['email'])}"
+            enqueue_email(
+                db,
+                recipient=user["email"],
+                subject="Account Verification",
+                body=f"Hi! Click this link to verify your email:\n\n{link}"
+            )
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users from CSV or JSONL")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=Config.HASH_POOL_WORKERS, help="hashing processes, 0 means one per core")
+    status = parser.add_mutually_exclusive_group()
+    status.add_argument("--verified", action="store_true", help="mark imported users as verified")
+    status.add_argument("--send-verification", action="store_true", help="queue a verification email per user in the outbox")
+    parser.add_argument("--duplicates", type=Path, help="write skipped records to this csv")
+    args = parser.parse_args()
+
+    file_format = args.format or ("jsonl" if args.path.suffix in (".jsonl", ".ndjson") else "csv")
+    hasher = PasswordHasher(workers=args.workers)
+    skipped_file = args.duplicates.open("w", newline="", encoding="utf-8") if args.duplicates else None
+    skipped_writer = csv.writer(skipped_file) if skipped_file else None
+    if skipped_writer:
+        skipped_writer.writerow(["username", "email", "reason"])
+
+    imported = skipped = 0
+    start = time.perf_counter()
+
+    def skip(record: dict, reason: str):
+        nonlocal skipped
+        skipped += 1
+        if skipped_writer:
+            skipped_writer.writerow([record.get("username"), record.get("email"), reason])
+
+    db = sessionLocal()
+    try:
+        for records in batches(read_records(args.path, file_format), args.batch_size):
+            users, seen_usernames, seen_emails = [], set(), set()
+            for record in records:
+                user, error = validate(record)
+                if error:
+                    skip(record, error)
+                    continue
+                key_username, key_email = user["username"].lower(), user["email"].lower()
+                if key_username in seen_usernames or key_email in seen_emails:
+                    skip(record, "duplicate in file")
+                    continue
+                seen_usernames.add(key_username)
+                seen_emails.add(key_email)
+                users.append(user)
+
+            # drop existing users before paying for any hashing
+            taken_usernames, taken_emails = existing_keys(db, users) if users else (set(), set())
+            new_users = []
+            for user in users:
+                if user["username"].lower() in taken_usernames or user["email"].lower() in taken_emails:
+                    skip(user, "already exists")
+                else:
+                    new_users.append(user)
+
+            plain = [u for u in new_users if u["plain_password"] is not None]
+            hashes = hasher.executor.map(hash_password, [u["plain_password"] for u in plain], chunksize=max(1, len(plain) // (hasher.workers * 4)))
+            for user, hashed in zip(plain, hashes):
+                user["password"] = hashed
+            rows = [
+                {"username": u["username"], "email": u["email"], "password": u["password"], "role": u["role"], "is_verified": args.verified}
+                for u in new_users
+            ]
+
+            if rows:
+                try:
+                    insert_users(db, rows, args.send_verification)
+                    imported += len(rows)
+                except IntegrityError:
+                    # someone registered one of these meanwhile, fall back to row by row for this batch
+                    db.rollback()
+                    for row in rows:
+                        try:
+                            insert_users(db, [row], args.send_verification)
+                            imported += 1
+                        except IntegrityError:
+                            db.rollback()
+                            skip(row, "already exists")
+
+            elapsed = time.perf_counter() - start
+            print(f"imported {imported}, skipped {skipped}, {imported / elapsed:.0f} users/s", file=sys.stderr)
+    finally:
+        db.close()
+        hasher.shutdown()
+        if skipped_file:
+            skipped_file.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"done: imported {imported}, skipped {skipped} in {elapsed:.1f}s ({imported / elapsed:.0f} users/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Email outbox dispatcher, runs separately from the API processes.
+
+Usage (from src/): python -m cli.outbox_worker [--batch-size 50] [--poll 2] [--once]
+Several workers can run side by side, claimed rows are never handed out twice.
+"""
+import argparse
+import logging
+import signal
+import time
+
+from database.database import sessionLocal
+from services.outbox import dispatch_batch
+from services.mail import mail_pool
+from config import Config
+
+logger = logging.getLogger("outbox_worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send pending emails from the outbox table")
+    parser.add_argument("--batch-size", type=int, default=Config.OUTBOX_BATCH_SIZE)
+    parser.add_argument("--poll", type=float, default=Config.OUTBOX_POLL_SECONDS, help="seconds to sleep when the outbox is empty")
+    parser.add_argument("--once", action="store_true", help="drain the outbox once and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    running = True
+    def stop(signum, frame):
+        nonlocal running
+        running = False  # finish the current batch, then exit
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while running:
+        db = sessionLocal()
+        try:
+            claimed = dispatch_batch(db, args.batch_size)
+        except Exception:
+            logger.exception("outbox batch failed")
+            claimed = 0
+        finally:
+            db.close()
+
+        if claimed:
+            logger.info("processed %d emails", claimed)
+        elif args.once:
+            break
+        else:
+            time.sleep(args.poll)
+    mail_pool.close_idle()
+
+
+if __name__ == "__main__":
+    main()
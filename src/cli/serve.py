@@ -0,0 +1,216 @@
+"""Production server, pre-forked uvicorn workers.
+
+Usage (from src/): python -m cli.serve [--host 127.0.0.1] [--port 8002] [--workers N]
+                                       [--db-connections N] [--reuse-port] [--graceful-timeout 30]
+
+The app is imported once in this process and the workers are forked from it, so
+the imports are paid once and their memory pages are shared. Every worker is a
+uvicorn server, with uvloop and httptools when they are installed
+(pip install uvloop httptools). By default the workers accept on one shared
+socket; with --reuse-port each binds its own with SO_REUSEPORT and the kernel
+spreads new connections evenly between them (Linux).
+
+SIGTERM or SIGINT: the workers stop accepting, finish the requests in flight
+for up to --graceful-timeout seconds, run the lifespan shutdown and exit. A
+worker that dies while serving is replaced, one that fails at startup stops the
+whole server.
+
+Sizing, per worker:
+  - with --db-connections (DB_CONNECTION_BUDGET) each worker gets
+    budget // workers connections, DB_POOL_SIZE of them kept open and the
+    rest as overflow, so the database never sees more than the budget
+  - unless HASH_POOL_WORKERS is set, the hashing processes are split over the
+    workers, cores // workers each, instead of every worker starting one per core
+
+Throughput across worker counts has NOT been measured on a multi-core host.
+The only measurement so far ran on a single CPU, where extra workers cannot
+help and none was seen (GET /protected, 2000 requests, 32 clients):
+
+  python benchmarks/bench_endpoints.py --mode http --scenarios protected \
+      --requests 2000 --concurrency 32 --workers N
+
+  workers   1: 173 req/s
+  workers   2: 168 req/s
+
+Run the same command on the target host for each worker count before sizing
+--workers.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from config import Config
+
+logger = logging.getLogger("serve")
+
+LOOP = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+HTTP = "httptools" if importlib.util.find_spec("httptools") else "h11"
+BOOT_SECONDS = 5  # a worker exiting sooner than this failed to start, it is not restarted
+
+
+def pool_sizes(budget: int, workers: int) -> tuple[int, int]:
+    """(pool_size, max_overflow) of one worker, so that all workers stay within `budget` connections."""
+    per_worker = max(budget // workers, 1)
+    pool_size = min(Config.DB_POOL_SIZE, per_worker)
+    return pool_size, per_worker - pool_size
+
+
+def hash_workers(workers: int) -> int:
+    return max((os.cpu_count() or 1) // workers, 1)
+
+
+def configure(workers: int, budget: int):
+    # before main is imported, the engines and the password hasher read these once
+    if budget:
+        if budget < workers:
+            logger.warning("%d db connections for %d workers, each worker still gets one", budget, workers)
+        Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW = pool_sizes(budget, workers)
+    if not Config.HASH_POOL_WORKERS:
+        Config.HASH_POOL_WORKERS = hash_workers(workers)
+    if workers > 1 and Config.RATE_LIMIT_STORAGE.startswith("memory://"):
+        logger.warning("RATE_LIMIT_STORAGE is memory://, every worker counts its own requests")
+
+
+def bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def reset_after_fork():
+    # a child must never use a connection opened by the parent. The parent only imported
+    # the app, but drop whatever it may hold: the pooled engine connections and the
+    # thread-local connections of the sqlite rate limit / login throttle backends
+    from database.database import engine, async_engine
+    from database.replicas import replica_set
+    from services.ratelimit import SQLiteBackend, limiter
+    from services.login_throttle import login_throttle
+    for backend in (limiter.backend, login_throttle.backend):
+        if isinstance(backend, SQLiteBackend):
+            backend.reset()
+    engine.dispose(close=False)
+    if async_engine is not None:
+        async_engine.sync_engine.dispose(close=False)
+    for replica in replica_set.replicas:
+        for sync_engine in replica._sync_engines():
+            sync_engine.dispose(close=False)
+
+
+def serve(app, sock: socket.socket, args):
+    config = uvicorn.Config(
+        app, loop=LOOP, http=HTTP, log_level=args.log_level,
+        timeout_graceful_shutdown=args.graceful_timeout, proxy_headers=args.proxy_headers
+    )
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def run_worker(app, shared: socket.socket | None, args):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    reset_after_fork()
+    sock = shared or bind_socket(args.host, args.port, reuse_port=True)
+    try:
+        serve(app, sock, args)
+    except SystemExit as e:
+        # uvicorn exits with 3 when the lifespan startup fails
+        os._exit(e.code if isinstance(e.code, int) else 1)
+    except BaseException:
+        logger.exception("worker %d crashed", os.getpid())
+        os._exit(1)
+    os._exit(0)
+
+
+def supervise(app, args) -> int:
+    shared = None if args.reuse_port else bind_socket(args.host, args.port, reuse_port=False)
+    children: dict[int, float] = {}  # pid -> start time
+    stopping = False
+    deadline = None
+    exit_code = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker(app, shared, args)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping, deadline
+        if stopping:
+            return
+        logger.info("%s, draining %d workers", signal.Signals(signum).name, len(children))
+        stopping = True
+        deadline = time.monotonic() + args.graceful_timeout + 10  # plus the lifespan shutdown
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    logger.info("%d workers on %s:%d, loop %s, http %s", args.workers, args.host, args.port, LOOP, HTTP)
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping and time.monotonic() > deadline:
+                logger.warning("killing %d workers still running after the graceful timeout", len(children))
+                for child in children:
+                    os.kill(child, signal.SIGKILL)
+                deadline = float("inf")
+            time.sleep(0.1)
+            continue
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        if time.monotonic() - started < BOOT_SECONDS:
+            logger.error("worker %d failed to start (status %d), stopping", pid, os.waitstatus_to_exitcode(status))
+            exit_code = 1
+            stop(signal.SIGTERM, None)
+        else:
+            logger.warning("worker %d exited (status %d), starting a new one", pid, os.waitstatus_to_exitcode(status))
+            spawn()
+    return exit_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with several uvicorn workers")
+    parser.add_argument("--host", default=Config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=Config.SERVER_WORKERS, help="0 means one per cpu core")
+    parser.add_argument("--db-connections", type=int, default=Config.DB_CONNECTION_BUDGET,
+                        help="total database connections of all workers, 0 keeps DB_POOL_SIZE/DB_MAX_OVERFLOW per worker")
+    parser.add_argument("--reuse-port", action="store_true", default=Config.SERVER_REUSE_PORT)
+    parser.add_argument("--graceful-timeout", type=int, default=Config.GRACEFUL_TIMEOUT)
+    parser.add_argument("--proxy-headers", action="store_true", help="trust X-Forwarded-For/Proto from the proxy in front")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    args.workers = args.workers or os.cpu_count() or 1
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    if args.reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+        parser.error("SO_REUSEPORT is not available on this platform")
+    if args.workers > 1 and not hasattr(os, "fork"):
+        parser.error("several workers need fork, run one worker per process on this platform")
+
+    configure(args.workers, args.db_connections)
+    from main import app  # preloaded, the workers inherit the imported app
+
+    if args.workers == 1:
+        serve(app, bind_socket(args.host, args.port, args.reuse_port), args)
+        return
+    sys.exit(supervise(app, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,36 @@ SRC_DIR = Path(__file__).resolve().parent
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./user.db"
+    # async request path, the async url is derived from DATABASE_URL when not set
+    DB_ASYNC: bool = False
+    ASYNC_DATABASE_URL: str | None = None
+    # read replicas, comma separated urls, reads of the principal lookups and user listing go here
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_HEALTH_INTERVAL: int = 5  # seconds between health checks, also how long a failed replica is skipped
+    READ_YOUR_WRITES_SECONDS: int = 5  # a user's reads stay on the primary this long after their own write
+
+    # connection pool per process, for every database except in-memory sqlite
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds, -1 keeps connections forever
+    DB_POOL_PRE_PING: bool = False  # test connections on checkout, for servers/proxies that drop idle ones
+    # cli/serve.py splits this many connections over its workers, 0 keeps the sizes above per worker
+    DB_CONNECTION_BUDGET: int = 0
+
+    # sqlite only, applied to every new connection, empty or 0 keeps the sqlite default
+    SQLITE_JOURNAL_MODE: str = "WAL"  # readers are not blocked by a writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # with WAL, fsync at checkpoints instead of every commit
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 268435456  # bytes
+    SQLITE_CACHE_SIZE: int = -64000  # pages, negative means KiB
 
     JWT_SECRET_KEY: str
     JWT_ALGO: str
+    # asymmetric algorithms (RS256, ES256, EdDSA...) read <kid>.pem keys from this directory
+    JWT_KEYS_DIR: str | None = None
+    JWT_ACTIVE_KID: str | None = None
+    JWKS_MAX_AGE: int = 300
 
     TOKEN_SECRET_KEY: str
 
@@ -17,6 +44,84 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str
     SMTP_HOST: str
     SMTP_PORT: int
+    SMTP_STARTTLS: bool = True
+    # pooled smtp connections, idle timeout in seconds
+    SMTP_POOL_SIZE: int = 4
+    SMTP_IDLE_TIMEOUT: int = 60
+    SMTP_MAX_RETRIES: int = 3
+    # outbox worker, see cli/outbox_worker.py
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_SECONDS: float = 2
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    OUTBOX_RETRY_SECONDS: int = 30
+    OUTBOX_LOCK_TIMEOUT: int = 300
+
+    # password hashing pool, 0 workers means one per cpu core
+    HASH_POOL_WORKERS: int = 0
+    HASH_MAX_PENDING: int = 64
+    HASH_LATENCY_BUDGET_MS: int = 2000
+
+    # python -m cli.serve, 0 workers means one per cpu core
+    SERVER_HOST: str = "127.0.0.1"
+    SERVER_PORT: int = 8002
+    SERVER_WORKERS: int = 0
+    SERVER_REUSE_PORT: bool = False  # one socket per worker, the kernel spreads the connections (Linux)
+    GRACEFUL_TIMEOUT: int = 30  # seconds in-flight requests get to finish after SIGTERM
+
+    # open db connections, start the hashing processes and load crypto backends before serving
+    STARTUP_WARMUP: bool = True
+
+    # GET /metrics in the Prometheus text format, plus the middleware and SQL hooks feeding it
+    METRICS_ENABLED: bool = True
+
+    # development aid, logs the SQL of every request and warns on repeats and lazy loads
+    QUERY_PROFILING: bool = False
+    QUERY_BUDGET: int = 0  # warn when a request runs more statements, 0 disables
+    # how the 2fa routes load totp_config with the user: joined (one query) or selectin (two)
+    TOTP_EAGER_LOAD: str = "joined"
+
+    # password hash policy, pick values with python -m cli.calibrate_hashing
+    # hashes made under an older policy are re-hashed on the next login
+    PASSWORD_SCHEME: str = "bcrypt"  # bcrypt or argon2 (needs argon2-cffi)
+    BCRYPT_ROUNDS: int = 12
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536  # KiB
+    ARGON2_PARALLELISM: int = 4
+
+    # authenticated user snapshots, ttl in seconds, 0 disables the cache
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: int = 60
+
+    # authorize role checks from token claims, the user row is still loaded on a principal
+    # cache miss to check the token_version
+    AUTH_STATELESS: bool = False
+
+    # already verified tokens, entries never outlive the token's exp
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: int = 1800
+
+    # how often each worker reloads revoked token ids from the database
+    REVOCATION_SYNC_SECONDS: int = 5
+
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+
+    # token bucket rate limits, storage is memory://, sqlite:///<path> (shared by the
+    # workers of one host, a relative path is relative to src/) or redis://... (shared across hosts)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_STORAGE: str = "sqlite:///./ratelimit.db"
+    RATE_LIMIT_DEFAULT: str = "100/day"
+    RATE_LIMIT_LOGIN: str = "5/minute"
+    RATE_LIMIT_REGISTER: str = "3/minute"
+    RATE_LIMIT_FORGET_PASSWORD: str = "3/hour"
+
+    # failed logins per username, checked before the user lookup and the password hash.
+    # Storage as above, memory:// counts per worker, the lock kept on the user row is shared.
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_THROTTLE_STORAGE: str = "memory://"
+    LOGIN_FAILURE_WINDOW: int = 900  # seconds, older failures are forgotten
+    LOGIN_FREE_FAILURES: int = 5  # failures within the window before any delay
+    LOGIN_BACKOFF_SECONDS: float = 1  # first delay, doubles with every further failure
+    LOGIN_LOCKOUT_SECONDS: int = 900  # longest delay, reached after ~10 more failures
 
     model_config = SettingsConfigDict(env_file=str(SRC_DIR / ".env"), extra="ignore")
 
@@ -1,15 +1,68 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import CursorResult, FrozenResult, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
 from pathlib import Path
+from database.profiler import install_profiler, profile_request
 from config import Config
 #BASE_DIR = Path(__file__).resolve().parent.parent.parent
 #DB_PATH = BASE_DIR / "user.db"
 #SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 SQLALCHEMY_DATABASE_URL = Config.DATABASE_URL
 
-connect_args = {"check_same_thread": False} # This is for sqlite only
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {} # This is for sqlite only
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+
+def engine_options(url: str) -> dict:
+    options = {"pool_pre_ping": Config.DB_POOL_PRE_PING}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        # in-memory sqlite lives in a single connection, there is no pool to size
+        return options
+    options.update(
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE
+    )
+    return options
+
+
+def sqlite_pragmas() -> list[str]:
+    pragmas = []
+    if Config.SQLITE_JOURNAL_MODE:
+        pragmas.append(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}")
+    if Config.SQLITE_SYNCHRONOUS:
+        pragmas.append(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+    if Config.SQLITE_BUSY_TIMEOUT_MS:
+        pragmas.append(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+    if Config.SQLITE_MMAP_SIZE:
+        pragmas.append(f"PRAGMA mmap_size={int(Config.SQLITE_MMAP_SIZE)}")
+    if Config.SQLITE_CACHE_SIZE:
+        pragmas.append(f"PRAGMA cache_size={int(Config.SQLITE_CACHE_SIZE)}")
+    return pragmas
+
+
+def apply_sqlite_pragmas(engine):
+    """Runs the SQLITE_* pragmas on every new connection (for an AsyncEngine pass .sync_engine)."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **engine_options(SQLALCHEMY_DATABASE_URL))
+apply_sqlite_pragmas(engine)
+if Config.QUERY_PROFILING:
+    install_profiler(engine)
 
 sessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
@@ -24,4 +77,164 @@ def get_db():
 
 # Done by alembic
 # def create_table():
-    # Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # Base.metadata.create_all(bind=engine)
+
+
+# async mode, DB_ASYNC=true switches the request path to an AsyncEngine
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+async_engine = None
+asyncSessionLocal = None
+
+if Config.DB_ASYNC:
+    ASYNC_URL = Config.ASYNC_DATABASE_URL or async_database_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_URL, **engine_options(ASYNC_URL))
+    apply_sqlite_pragmas(async_engine.sync_engine)
+    # expire_on_commit=False, reading attributes after commit must not trigger implicit IO
+    asyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    if Config.QUERY_PROFILING:
+        install_profiler(async_engine.sync_engine)
+
+
+class SyncSessionAdapter:
+    """Gives a sync Session the AsyncSession interface used by the routes.
+
+    Every call that talks to the database runs in the threadpool, so the route
+    code is the same whether DB_ASYNC is on or off.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def add(self, instance):
+        self.session.add(instance)
+
+    def add_all(self, instances):
+        self.session.add_all(instances)
+
+    async def execute(self, statement, params=None):
+        # results are buffered in the thread so the event loop never reads the cursor
+        def run():
+            result = self.session.execute(statement, params)
+            if isinstance(result, CursorResult) and not result.returns_rows:
+                return result
+            return result.freeze()
+        result = await run_in_threadpool(run)
+        # UPDATE/DELETE without RETURNING come back as is, for rowcount
+        return result() if isinstance(result, FrozenResult) else result
+
+    async def scalar(self, statement, params=None):
+        return await run_in_threadpool(self.session.scalar, statement, params)
+
+    async def scalars(self, statement, params=None):
+        return (await self.execute(statement, params)).scalars()
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.session.get, entity, ident)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.session.flush)
+
+    async def commit(self):
+        await run_in_threadpool(self.session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.session.rollback)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.session.refresh, instance)
+
+    async def close(self):
+        await run_in_threadpool(self.session.close)
+
+
+async def get_async_db(request: Request):
+    async for db in request_session(request, sessionLocal, asyncSessionLocal):
+        yield db
+
+
+async def request_session(request: Request, sync_factory, async_factory):
+    """Request scoped session from the async factory when DB_ASYNC is on, else from the sync one."""
+    if Config.QUERY_PROFILING:
+        # logs the statements of this request once it is done
+        with profile_request(f"{request.method} {request.url.path}", Config.QUERY_BUDGET):
+            async for db in _open_session(sync_factory, async_factory):
+                yield db
+    else:
+        async for db in _open_session(sync_factory, async_factory):
+            yield db
+
+
+async def _open_session(sync_factory, async_factory):
+    if async_factory is not None:
+        async with async_factory() as db:
+            yield db
+    else:
+        # same commit semantics as the async sessions, no implicit reload after commit
+        db = SyncSessionAdapter(sync_factory(expire_on_commit=False))
+        try:
+            yield db
+        finally:
+            await db.close()
+
+
+async def stream_partitions(statement, size: int, sync_factory=None, async_factory=None):
+    """Yields the rows of `statement` in lists of at most `size` rows.
+
+    Opens its own session, so it can outlive the request scoped one, e.g. inside
+    a StreamingResponse, and only keeps one chunk in memory at a time. Uses the
+    primary unless the factories of another engine are given.
+    """
+    if sync_factory is None:
+        sync_factory, async_factory = sessionLocal, asyncSessionLocal
+    statement = statement.execution_options(yield_per=size)
+    if async_factory is not None:
+        async with async_factory() as db:
+            result = await db.stream(statement)
+            async for partition in result.partitions():
+                yield partition
+    else:
+        db = sync_factory()
+        try:
+            result = await run_in_threadpool(db.execute, statement)
+            partitions = result.partitions()
+            while (partition := await run_in_threadpool(next, partitions, None)) is not None:
+                yield partition
+        finally:
+            await run_in_threadpool(db.close)
+
+
+async def warm_up_pool(connections: int):
+    """Opens pooled connections up front, the first requests do not pay the connect and dialect setup."""
+    if async_engine is not None:
+        opened = [await async_engine.connect() for _ in range(connections)]
+        for conn in opened:
+            await conn.close()
+    else:
+        def open_and_return():
+            opened = [engine.connect() for _ in range(connections)]
+            for conn in opened:
+                conn.close()
+        await run_in_threadpool(open_and_return)
+
+
+async def ping_database():
+    if async_engine is not None:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    else:
+        def ping():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        await run_in_threadpool(ping)
@@ -0,0 +1,125 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Development aid, QUERY_PROFILING=true records the SQL of every request through
+# the session dependencies and logs it when the request is done. Statements that
+# repeat within one request and relationship loads are what N+1 patterns look like.
+
+
+class QueryProfile:
+
+    def __init__(self):
+        self.statements: list[tuple[str, float]] = []  # (sql, seconds)
+        self.relationship_loads: list[str] = []  # e.g. "User.totp_config"
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def duration(self) -> float:
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self) -> dict[str, int]:
+        counts = Counter(sql for sql, _ in self.statements)
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+    def report(self, name: str, budget: int = 0):
+        logger.info("%s: %d queries in %.1f ms", name, self.count, self.duration * 1000)
+        for sql, seconds in self.statements:
+            logger.debug("%.2f ms  %s", seconds * 1000, " ".join(sql.split()))
+        for sql, count in self.repeated().items():
+            logger.warning("%s: statement ran %d times, possible N+1: %s", name, count, " ".join(sql.split()))
+        for path in self.relationship_loads:
+            logger.warning("%s: separate query to load %s (lazy or selectin load)", name, path)
+        if budget and self.count > budget:
+            logger.warning("%s: %d queries, over the budget of %d", name, self.count, budget)
+
+
+current_profile: ContextVar[QueryProfile | None] = ContextVar("current_profile", default=None)
+
+
+def install_profiler(engine):
+    """Records statements into the profile of the current request (for an AsyncEngine pass .sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if current_profile.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        profile = current_profile.get()
+        if profile is not None and conn.info.get("profile_start"):
+            profile.statements.append((statement, time.perf_counter() - conn.info["profile_start"].pop()))
+
+
+@contextmanager
+def profile_request(name: str, budget: int = 0):
+    profile = current_profile.get()
+    if profile is not None:
+        # a second session in the same request (primary and replica), one profile for both
+        yield profile
+        return
+    profile = QueryProfile()
+    # reset, not left to the request's context: a caller sharing its context (a test,
+    # a background task) must not keep recording into a finished profile
+    token = current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        current_profile.reset(token)
+        profile.report(name, budget)
+
+
+def _loader_path(orm_execute_state) -> str:
+    path = orm_execute_state.loader_strategy_path
+    return f"{path.parent[-1].class_.__name__}.{path[-1].key}" if path else str(orm_execute_state.statement)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_relationship_load(orm_execute_state):
+    # lazy loads and selectin/subquery eager loads, joined loads never get here
+    profile = current_profile.get()
+    if profile is not None and orm_execute_state.is_relationship_load:
+        profile.relationship_loads.append(_loader_path(orm_execute_state))
+
+
+# Test helpers. The request runs in another thread under TestClient, so these
+# listen on every engine instead of going through the request context.
+
+@contextmanager
+def capture_queries():
+    profile = QueryProfile()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        profile.statements.append((statement, 0.0))
+
+    def record_relationship_load(orm_execute_state):
+        if orm_execute_state.is_relationship_load:
+            profile.relationship_loads.append(_loader_path(orm_execute_state))
+
+    event.listen(Engine, "after_cursor_execute", record)
+    event.listen(Session, "do_orm_execute", record_relationship_load)
+    try:
+        yield profile
+    finally:
+        event.remove(Engine, "after_cursor_execute", record)
+        event.remove(Session, "do_orm_execute", record_relationship_load)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """with assert_max_queries(2): client.post("/2fa/enable", ...)"""
+    with capture_queries() as profile:
+        yield profile
+    statements = "\n".join(" ".join(sql.split()) for sql, _ in profile.statements)
+    assert profile.count <= limit, f"{profile.count} queries, expected at most {limit}:\n{statements}"
@@ -0,0 +1,164 @@
+import asyncio
+import itertools
+import logging
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from auth.cache import TTLCache
+from database.database import (
+    engine_options, apply_sqlite_pragmas, async_database_url, request_session, sessionLocal, asyncSessionLocal
+)
+from database.profiler import install_profiler
+from services.metrics import instrument_engine
+from models.models import User
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Read-only traffic (principal lookups, user listing) can go to replicas listed in
+# DATABASE_REPLICA_URLS. Replicas are used round robin, one that fails is skipped
+# until a health check sees it answer again, and without any healthy replica
+# reads fall back to the primary.
+
+
+class Replica:
+
+    def __init__(self, url: str):
+        self.name = make_url(url).render_as_string(hide_password=True)
+        connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+        self.engine = create_engine(url, connect_args=connect_args, **engine_options(url))
+        self.sessionLocal = sessionmaker(bind=self.engine, autocommit=False, autoflush=False)
+        self.async_engine = None
+        self.asyncSessionLocal = None
+        if Config.DB_ASYNC:
+            async_url = async_database_url(url)
+            self.async_engine = create_async_engine(async_url, **engine_options(async_url))
+            self.asyncSessionLocal = async_sessionmaker(bind=self.async_engine, autoflush=False, expire_on_commit=False)
+
+        for sync_engine in self._sync_engines():
+            apply_sqlite_pragmas(sync_engine)
+            event.listen(sync_engine, "handle_error", self._on_error)
+            if Config.QUERY_PROFILING:
+                install_profiler(sync_engine)
+            if Config.METRICS_ENABLED:
+                # same statement and per request accounting as the primary engines in main.py
+                instrument_engine(sync_engine, database="replica")
+        self.down_until = 0.0
+
+    def _sync_engines(self):
+        return [self.engine] if self.async_engine is None else [self.engine, self.async_engine.sync_engine]
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self, reason):
+        if self.healthy:
+            logger.warning("replica %s marked down: %s", self.name, reason)
+        self.down_until = time.monotonic() + Config.REPLICA_HEALTH_INTERVAL
+
+    def _on_error(self, context):
+        # connection level failures only, a bad statement says nothing about the replica
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, OperationalError):
+            self.mark_down(context.original_exception)
+
+    def _ping(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    async def check(self):
+        try:
+            if self.async_engine is not None:
+                async with self.async_engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            else:
+                await run_in_threadpool(self._ping)
+        except Exception as e:
+            self.mark_down(e)
+        else:
+            if not self.healthy:
+                logger.info("replica %s is back", self.name)
+            self.down_until = 0.0
+
+    async def dispose(self):
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        self.engine.dispose()
+
+
+class ReplicaSet:
+
+    def __init__(self, urls: list[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._counter = itertools.count()
+
+    def pick(self) -> Replica | None:
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._counter) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        return None
+
+    async def check(self):
+        await asyncio.gather(*[replica.check() for replica in self.replicas])
+
+    async def run_health_checks(self):
+        while True:
+            await asyncio.sleep(Config.REPLICA_HEALTH_INTERVAL)
+            await self.check()
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.dispose()
+
+
+replica_set = ReplicaSet([url.strip() for url in Config.DATABASE_REPLICA_URLS.split(",") if url.strip()])
+
+# username -> True for READ_YOUR_WRITES_SECONDS after a commit changed that user.
+# Per process, like the principal cache, replication lag is expected to be shorter.
+recent_writers = TTLCache(maxsize=100_000, ttl=Config.READ_YOUR_WRITES_SECONDS)
+
+
+def _collect_user_writes(session, flush_context):
+    written = session.info.setdefault("written_usernames", set())
+    written.update(obj.username for obj in (*session.new, *session.dirty) if isinstance(obj, User) and obj.username)
+
+
+def _mark_recent_writers(session):
+    for username in session.info.pop("written_usernames", ()):
+        recent_writers.set(username, True)
+
+
+def _forget_user_writes(session, *args):
+    session.info.pop("written_usernames", None)
+
+
+if replica_set.replicas:
+    event.listen(Session, "after_flush", _collect_user_writes)
+    event.listen(Session, "after_commit", _mark_recent_writers)
+    event.listen(Session, "after_rollback", _forget_user_writes)
+
+
+def read_factories(username: str | None = None) -> tuple:
+    """(sync, async) session factories for a read, a replica unless `username` wrote recently."""
+    if replica_set.replicas and not (username and recent_writers.get(username)):
+        replica = replica_set.pick()
+        if replica is not None:
+            return replica.sessionLocal, replica.asyncSessionLocal
+    return sessionLocal, asyncSessionLocal
+
+
+async def read_session(request: Request, username: str | None = None):
+    async for db in request_session(request, *read_factories(username)):
+        yield db
+
+
+async def get_read_db(request: Request):
+    # for reads that are not about the caller's own data
+    async for db in read_session(request):
+        yield db
@@ -1,3 +1,4 @@
+import math
 from fastapi import HTTPException, status
 
 class AuthError:
@@ -19,6 +20,13 @@ class AuthError:
             status_code=status.HTTP_403_FORBIDDEN,
             detail=detail
         )
+
+    def too_many_attempts(retry_after: float, detail: str = "Too many failed login attempts, try again later"):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
     
 
     def invalid_or_expired(detail: str = "Invalid or expired token"):
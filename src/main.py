@@ -1,32 +1,64 @@
 # libraries
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.middleware import SlowAPIMiddleware
-from slowapi.errors import RateLimitExceeded
+from starlette.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import uvicorn
 
 # Local app modules
-from routers import auth_routes
-from database.database import get_db
+from routers import auth_routes, jwks_routes
+from database.database import get_db, engine, async_engine, warm_up_pool, ping_database
+from auth.hashing import password_hasher
+from auth.jwt import create_access_token, decode_token
+from auth.oauth2 import principal_cache
+from auth.jwt import token_cache
+from auth.revocation import revocation_store
+from database.replicas import replica_set
+from services.mail import mail_pool
+from services.ratelimit import RateLimitMiddleware
+from services import metrics
+from schemas.serialization import default_response_class
+from config import Config
 
 
-limiter = Limiter(key_func=get_remote_address, default_limits=["100/day"])   # IP based rate limiting
+async def warm_up():
+    # one time costs that would otherwise land on the first requests
+    await warm_up_pool(Config.DB_POOL_SIZE)
+    await password_hasher.warm_up()
+    decode_token(create_access_token({"sub": "warmup"}))
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # create_table()  # SQLAlchemy sync function, no await
     # done by alembic 
+    app.state.ready = False
+    if Config.STARTUP_WARMUP:
+        await warm_up()
+    await run_in_threadpool(revocation_store.sync)
+    revocation_sync = asyncio.create_task(revocation_store.run_sync_loop())
+    replica_checks = None
+    if replica_set.replicas:
+        await replica_set.check()
+        replica_checks = asyncio.create_task(replica_set.run_health_checks())
+    app.state.ready = True
     yield
+    app.state.ready = False
+    revocation_sync.cancel()
+    if replica_checks is not None:
+        replica_checks.cancel()
+        await replica_set.dispose()
+    password_hasher.shutdown()
+    mail_pool.close_idle()
+    if async_engine is not None:
+        await async_engine.dispose()
 
-app = FastAPI(title="auth", version="1.0.0", lifespan=lifespan)
+app = FastAPI(title="auth", version="1.0.0", lifespan=lifespan, default_response_class=default_response_class)
 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-app.add_middleware(SlowAPIMiddleware)
+# IP based rate limiting, counters are shared by all workers through RATE_LIMIT_STORAGE
+app.add_middleware(RateLimitMiddleware, rate=Config.RATE_LIMIT_DEFAULT, exempt=("/health", "/ready", "/metrics"))
 
 origins = ["*"]
 app.add_middleware(
@@ -38,6 +70,23 @@ app.add_middleware(
 )
 
 app.include_router(auth_routes.router)
+app.include_router(jwks_routes.router)
+
+if Config.METRICS_ENABLED:
+    metrics.instrument_engine(engine)
+    if async_engine is not None:
+        metrics.instrument_engine(async_engine.sync_engine)
+    metrics.register_cache("principal", principal_cache)
+    metrics.register_cache("token", token_cache)
+    metrics.registry.register(metrics.Gauge(
+        "password_hash_pending", "Password jobs queued or running in the hashing pool", (),
+        lambda: {(): password_hasher.pending}))
+    # added last, so it is the outermost middleware and also times the rate limiter
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get('/metrics', include_in_schema=False)
+    def prometheus_metrics():
+        return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get('/')
 def root():
@@ -47,7 +96,19 @@ def root():
 def health_check():
     return {"status": "ok"}
 
+# liveness is /health, readiness also needs the startup done and the database answering
+@app.get('/ready')
+async def readiness_check():
+    if not app.state.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        await ping_database()
+    except Exception:
+        return JSONResponse(status_code=503, content={"status": "database unavailable"})
+    return {"status": "ready"}
+
 # get_db()
 
+# single process for development, run python -m cli.serve in production
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8002)
\ No newline at end of file
+    uvicorn.run(app, host=Config.SERVER_HOST, port=Config.SERVER_PORT)
\ No newline at end of file
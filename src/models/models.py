@@ -1,5 +1,5 @@
 from database.database import Base
-from sqlalchemy import Column, Integer, String, Boolean, TIMESTAMP, func, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, TIMESTAMP, func, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 # from sqlalchemy.sql import func
@@ -15,11 +15,26 @@ class User(Base):
     password = Column(String, nullable=False)
     is_verified = Column(Boolean, default=False, nullable=False)
     role = Column(String, nullable=False, server_default="user")
+    token_version = Column(Integer, nullable=False, default=0, server_default="0") # bumped to invalidate issued tokens
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
     # When a row is inserted, let the database automatically store the current time (UTC), and never allow it to be NULL.
+    # failed logins since the last successful one, see services/login_throttle.py
+    failed_login_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_failed_login_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    locked_until = Column(TIMESTAMP(timezone=True), nullable=True) # logins are refused before hashing until then
 
     totp_config = relationship("UserTOTP", back_populates="user", uselist=False) # One to one
 
+    __table_args__ = (
+        # case-insensitive uniqueness, lookups compare lower(column) so they hit these
+        Index("ix_users_username_lower", func.lower(username), unique=True),
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+        # keyset pagination on id, filtered by role / verification / signup date
+        Index("ix_users_role_id", "role", "id"),
+        Index("ix_users_is_verified_id", "is_verified", "id"),
+        Index("ix_users_created_at", "created_at"),
+    )
+
 class UserTOTP(Base):
     __tablename__ = "users_totp"
     id = Column(Integer, primary_key=True, index=True)
@@ -30,3 +45,38 @@ class UserTOTP(Base):
 
     user = relationship("User", back_populates="totp_config")
 
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    jti = Column(String, primary_key=True)
+    revoked_by = Column(String, nullable=False) # username of who revoked it, the owner on logout, the admin otherwise
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False, index=True) # rows can be purged after this
+    revoked_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String, unique=True, index=True, nullable=False) # sha256 of the opaque token, never the token itself
+    family_id = Column(String, nullable=False, index=True) # every token rotated from the same login
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    revoked_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, server_default="pending") # pending, sending, sent, failed
+    attempts = Column(Integer, nullable=False, server_default="0")
+    last_error = Column(Text, nullable=True)
+    available_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now()) # not retried before this
+    locked_at = Column(TIMESTAMP(timezone=True), nullable=True) # when a worker claimed the row
+    sent_at = Column(TIMESTAMP(timezone=True), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_available_at", "status", "available_at"),
+    )
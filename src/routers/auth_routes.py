@@ -1,62 +1,89 @@
 # Standard library
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import base64
-import PIL
+import hashlib
+import uuid
+from typing import Literal
 
 # libraries
-from fastapi import APIRouter, Depends, status, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, status, HTTPException, Query, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from starlette.responses import JSONResponse, Response
+from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 
 # Local app modules
 from models.models import User, UserTOTP
 from schemas.schemas import (
     UserCreate, UserCreateResponse, UserLogin, Token, UserResponse,
-    PasswordResetRequest, ResetPassword, TOTPVerify
+    PasswordResetRequest, ResetPassword, TOTPVerify, UserPrincipal, TokenData,
+    RevokeTokenRequest, RefreshTokenRequest
 )
-from database.database import get_db
-from auth.utils import hash_password, verify_password, generate_token, verify_token
-from auth.jwt import create_access_token
-from auth.oauth2 import get_current_active_user, RoleChecker
-from auth.totp import TwoFactorAuth
-from services.mail import send_email
+from schemas.serialization import dump_user_rows, dump_user_rows_ndjson
+from database.database import get_async_db, stream_partitions
+from database.replicas import read_factories
+from auth.utils import generate_token, verify_token
+from auth.hashing import password_hasher
+from auth.jwt import create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from auth.revocation import revocation_store
+from auth.refresh import issue_refresh_token, rotate_refresh_token, revoke_family, revoke_user_refresh_tokens
+from auth.oauth2 import get_current_user, get_current_principal, get_current_user_with_totp, get_user_read_db, RoleChecker, principal_cache
+from auth.totp import TwoFactorAuth, QR_MEDIA_TYPES
+from services.outbox import enqueue_email
+from services.ratelimit import RateLimit
+from services.login_throttle import login_throttle
 from errors.errors import AuthError
 from config import Config
 
 router = APIRouter(tags=['auth'])
 
-@router.post('/register/', status_code=status.HTTP_201_CREATED, response_model=UserCreateResponse)
-def register(request: UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    # check if username or email already exists
-    user = db.query(User).filter(
-        (User.username == request.username) | (User.email == request.email)
-    ).first()
-    if user != None:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="username or email already exists"
-        )
-    
+def _user_access_token(user: User, session_id: str | None = None) -> str:
+    # creating token using username, role claims let AUTH_STATELESS authorize from the token,
+    # sid is the refresh token family of the login so /logout can end it
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "role": user.role,
+            "verified": user.is_verified,
+            "token_version": user.token_version,
+            "sid": session_id
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+@router.post('/register/', status_code=status.HTTP_201_CREATED, response_model=UserCreateResponse,
+             dependencies=[Depends(RateLimit("register", Config.RATE_LIMIT_REGISTER))])
+async def register(request: UserCreate, db: AsyncSession = Depends(get_async_db)):
     # hash password
-    hashed_password = hash_password(request.password)
+    hashed_password = await password_hasher.hash(request.password)
 
     # create user in db
     new_user = User(username=request.username, email=request.email, password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
 
-    # email verification
+    # email verification, queued in the outbox within the same transaction as the user
     verification_token = generate_token(new_user.email)
     verification_link = f"{Config.FRONTEND_URL}/verify-email/?token={verification_token}"
 
-    background_tasks.add_task(
-        send_email,
+    enqueue_email(
+        db,
         recipient=new_user.email,
         subject="Account Verification",
         body=f"Hi! Click this link to verify your email:\n\n{verification_link}"
     )
+    # no existence check first, the case-insensitive unique indexes reject duplicates
+    # in the same round trip, and unlike a check they cannot race a concurrent signup.
+    # id and created_at come back from the INSERT itself, no refresh needed.
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="username or email already exists"
+        )
 
     return UserCreateResponse(
         message= "User account created successfully, verification email will be sent",
@@ -72,14 +99,14 @@ def register(request: UserCreate, background_tasks: BackgroundTasks, db: Session
 
 
 @router.get('/verify-email/')
-def verify_email(token: str = Query(...), db: Session = Depends(get_db)):    # token is taken from the query parameter: /verify-email/?token=<the-token>
+async def verify_email(token: str = Query(...), db: AsyncSession = Depends(get_async_db)):    # token is taken from the query parameter: /verify-email/?token=<the-token>
     token_data = verify_token(token=token, max_age=86400)
     email = token_data.get("email")
 
     if email is None:
         AuthError.invalid_or_expired()
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(func.lower(User.email) == func.lower(email)))
     if not user:
         AuthError.user_not_found()
     
@@ -87,76 +114,183 @@ def verify_email(token: str = Query(...), db: Session = Depends(get_db)):    # t
         return {"message": "user is already verified"}
     
     user.is_verified = True
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.invalidate(user.username)
 
     return{
         "message":f"Email {user.email} sucessfully verified"
     }
 
 
-@router.post('/login', response_model=Token)
-def login(request: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)) -> Token:
-    user = db.query(User).filter(User.username == request.username).first()
+@router.post('/login', response_model=Token, dependencies=[Depends(RateLimit("login", Config.RATE_LIMIT_LOGIN))])
+async def login(request: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)) -> Token:
+    throttled = Config.LOGIN_THROTTLE_ENABLED
+    if throttled:
+        # blocked identifiers are turned away before any query or hashing
+        retry_after = await login_throttle.retry_after(request.username)
+        if retry_after:
+            AuthError.too_many_attempts(retry_after)
+    user = await db.scalar(select(User).where(func.lower(User.username) == func.lower(request.username)))
     if not user:
+        if throttled:
+            await login_throttle.failure(request.username)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Inavlid username or password")
+    now = datetime.now(timezone.utc)
+    if throttled and user.locked_until is not None:
+        # the lock on the row holds across restarts and workers with their own counters
+        locked_until = user.locked_until if user.locked_until.tzinfo else user.locked_until.replace(tzinfo=timezone.utc)
+        if locked_until > now:
+            AuthError.too_many_attempts((locked_until - now).total_seconds())
     if user.is_verified != True:
         AuthError.user_not_verified()
-    if not verify_password(request.password, user.password):
+    valid, new_hash = await password_hasher.verify_and_update(request.password, user.password)
+    if not valid:
+        if throttled:
+            blocked_for = await login_throttle.failure(request.username)
+            user.failed_login_count += 1
+            user.last_failed_login_at = now
+            if blocked_for:
+                user.locked_until = now + timedelta(seconds=blocked_for)
+            await db.commit()
         AuthError.invalid_credentials()
-
-    # create access token
-    access_token_expires = timedelta(minutes=30)
-    # creating token using username
-    access_token = create_access_token( 
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
-
-    return Token(access_token=access_token, token_type="bearer")
+    if new_hash:
+        # stored under an older cost policy, upgraded with the commit below
+        user.password = new_hash
+    if throttled and (user.failed_login_count or user.locked_until is not None):
+        await login_throttle.success(request.username)
+        user.failed_login_count = 0
+        user.locked_until = None
+
+    # create access token, the refresh token lets the client renew it without the password
+    session_id = str(uuid.uuid4())
+    access_token = _user_access_token(user, session_id)
+    refresh_token = issue_refresh_token(db, user.id, family_id=session_id)
+    await db.commit()
+
+    return Token(access_token=access_token, refresh_token=refresh_token, token_type="bearer")
+
+
+@router.post('/token/refresh', response_model=Token)
+async def refresh_access_token(request: RefreshTokenRequest, db: AsyncSession = Depends(get_async_db)) -> Token:
+    # one indexed lookup and no password hashing, the old refresh token is rotated out
+    user, refresh_token, session_id = await rotate_refresh_token(db, request.refresh_token)
+    return Token(access_token=_user_access_token(user, session_id), refresh_token=refresh_token, token_type="bearer")
+
+
+@router.post('/logout')
+async def logout(current_user: TokenData = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    # the refresh tokens of this login go first, otherwise they keep minting access tokens
+    if current_user.sid is not None:
+        await revoke_family(db, current_user.sid)
+    else:
+        # tokens minted before the sid claim don't say which login they belong to
+        user_id = await db.scalar(select(User.id).where(User.username == current_user.username))
+        await revoke_user_refresh_tokens(db, user_id)
+    await db.commit()
+    # the token stays revoked until its own expiry, after that decode_token rejects it anyway
+    await revocation_store.revoke(db, jti=current_user.jti, revoked_by=current_user.username, expires_at=current_user.exp)
+    return {"message": "Logged out successfully"}
+
+
+@router.post('/admin/revoke')
+async def revoke_token(request: RevokeTokenRequest, admin = Depends(RoleChecker(allowed_roles=["admin"])), db: AsyncSession = Depends(get_async_db)):
+    if request.jti is not None:
+        # the exp of an arbitrary jti is unknown, keep it for the longest possible token lifetime
+        expires_at = (datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)).timestamp()
+        await revocation_store.revoke(db, jti=request.jti, revoked_by=admin.username, expires_at=expires_at)
+        return {"message": f"Token {request.jti} revoked"}
+
+    user = await db.scalar(select(User).where(func.lower(User.username) == func.lower(request.username)))
+    if not user:
+        AuthError.user_not_found()
+    # every token minted before the bump fails the token_version check
+    user.token_version = user.token_version + 1
+    await revoke_user_refresh_tokens(db, user.id)
+    await db.commit()
+    await db.refresh(user)
+    principal_cache.set(user.username, UserPrincipal.model_validate(user))
+    return {"message": f"All tokens of {user.username} revoked"}
 
 
 @router.get('/protected')
-def protected_route(current_user: User = Depends(get_current_active_user)):
+async def protected_route(current_user: TokenData | UserPrincipal = Depends(get_current_principal)):
     return {
         "message": "Access granted",
         "username": current_user.username
     }
 
 
-@router.get('/all_users', response_model=list[UserResponse])
-def get_all_users(_ = Depends(RoleChecker(allowed_roles=["admin", "user"])), db: Session = Depends(get_db)):
-    users = db.query(User).all()
-    return users
-
-
+# only the columns of UserResponse are selected, never the password hash
+USER_RESPONSE_COLUMNS = (User.id, User.username, User.email, User.created_at, User.is_verified, User.role)
 
-@router.put('/forget-password')
-def forget_password(request: PasswordResetRequest, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == request.email).first()
+@router.get('/all_users', response_model=list[UserResponse])
+async def get_all_users(
+    cursor: int | None = Query(None, description="id of the last user of the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    role: str | None = None,
+    is_verified: bool | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    format: Literal["json", "ndjson"] = "json",
+    _ = Depends(RoleChecker(allowed_roles=["admin", "user"])),
+    db: AsyncSession = Depends(get_user_read_db)
+):
+    # keyset pagination, WHERE id > cursor ORDER BY id stays an index range scan at any depth
+    query = select(*USER_RESPONSE_COLUMNS).order_by(User.id)
+    if cursor is not None:
+        query = query.where(User.id > cursor)
+    if role is not None:
+        query = query.where(User.role == role)
+    if is_verified is not None:
+        query = query.where(User.is_verified == is_verified)
+    if created_after is not None:
+        query = query.where(User.created_at >= created_after)
+    if created_before is not None:
+        query = query.where(User.created_at < created_before)
+
+    if format == "ndjson":
+        # export mode, streams every matching user after the cursor in chunks, limit is ignored
+        async def export():
+            async for rows in stream_partitions(query, 1000, *read_factories()):
+                yield dump_user_rows_ndjson(rows)
+        return StreamingResponse(export(), media_type="application/x-ndjson")
+
+    users = (await db.execute(query.limit(limit))).all()
+    # rows straight to bytes, response_model stays for the schema in the docs
+    headers = {"X-Next-Cursor": str(users[-1].id)} if len(users) == limit else None
+    return Response(dump_user_rows(users), media_type="application/json", headers=headers)
+
+
+
+@router.put('/forget-password', dependencies=[Depends(RateLimit("forget-password", Config.RATE_LIMIT_FORGET_PASSWORD))])
+async def forget_password(request: PasswordResetRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(User).where(func.lower(User.email) == func.lower(request.email)))
     if not user:
         AuthError.user_not_found()
     reset_token = generate_token(user.email)
     reset_link = f"{Config.FRONTEND_URL}/reset-password/?token={reset_token}"
 
-    background_tasks.add_task(
-        send_email,
+    enqueue_email(
+        db,
         recipient=user.email,
         subject="Reset Password",
         body=f"Click this link to reset your password: \n\n {reset_link}"
     )
+    await db.commit()
 
     return {
         "message": "Password Reset link has been sent"
     }
 
 @router.post('/reset-password')
-def reset_password(request: ResetPassword, reset_token: str = Query(...), db: Session = Depends(get_db)):
+async def reset_password(request: ResetPassword, reset_token: str = Query(...), db: AsyncSession = Depends(get_async_db)):
     token_data = verify_token(token=reset_token, max_age=900)
     if not token_data:
         AuthError.invalid_or_expired()
     email = token_data.get("email")
 
-    user = db.query(User).filter(User.email == email).first()
+    user = await db.scalar(select(User).where(func.lower(User.email) == func.lower(email)))
     if not user:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Internal server err")
 
@@ -166,11 +300,16 @@ def reset_password(request: ResetPassword, reset_token: str = Query(...), db: Se
     if new_password != confirm_password:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Password Mismatch")
 
-    hashed_password = hash_password(new_password)
+    hashed_password = await password_hasher.hash(new_password)
     user.password = hashed_password
+    # tokens issued with the old password stop working
+    user.token_version = user.token_version + 1
+    await revoke_user_refresh_tokens(db, user.id)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    # keep the new version cached so stateless checks in this worker reject old tokens
+    principal_cache.set(user.username, UserPrincipal.model_validate(user))
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -182,53 +321,92 @@ def reset_password(request: ResetPassword, reset_token: str = Query(...), db: Se
     )
 
 @router.post('/2fa/enable')
-def enable_2fa(current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
-    
+async def enable_2fa(
+    inline_qr: bool = Query(True, description="embed the QR image, otherwise fetch it from GET /2fa/qr"),
+    qr_format: Literal["png", "svg"] = "png",
+    current_user: User = Depends(get_current_user_with_totp),
+    db: AsyncSession = Depends(get_async_db)
+):
+
+    # eager loaded together with the user
+    totp_config = current_user.totp_config
+
     # if totp_config exists and already is_enabled
-    if current_user.totp_config and current_user.totp_config.is_enabled:
+    if totp_config and totp_config.is_enabled:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2fa is already enabled")
     
-    # if totp_config exists but not enabled
-    if current_user.totp_config:
-        totp_config = current_user.totp_config
-    else:
+    # if totp_config does not exist yet, otherwise reuse the pending secret
+    if not totp_config:
         secret_key = TwoFactorAuth.generate_secret_key()
         totp_config = UserTOTP(
             user_id=current_user.id,
             secret_key=secret_key
             # We will keep is_enabled=False until user verify it
         )
+        db.add(totp_config)
+        await db.commit()
 
-    db.add(totp_config)
-    db.commit()
-    db.refresh(totp_config)
+    response = {
+        "message": "Scan QR code with Google authenticator",
+        "secret": totp_config.secret_key,
+        "qr_url": f"/2fa/qr?format={qr_format}"
+    }
+    if not inline_qr:
+        return response
 
     # return qrcode in base64 url
-    qr_code = TwoFactorAuth.generate_qr_code(
+    # image rendering is cpu bound, keep it off the event loop
+    qr_code = await run_in_threadpool(
+        TwoFactorAuth.generate_qr_code,
         current_user.username,
-        secret=totp_config.secret_key
+        secret=totp_config.secret_key,
+        image_format=qr_format
     )
 
     qr_code_base64 = base64.b64encode(qr_code).decode('utf-8')
+    response["qr_code"] = f"data:{QR_MEDIA_TYPES[qr_format]};base64,{qr_code_base64}"
+    return response
+
+
+@router.get('/2fa/qr')
+async def get_2fa_qr(
+    request: Request,
+    format: Literal["png", "svg"] = "png",
+    current_user: User = Depends(get_current_user_with_totp)
+):
+    totp_config = current_user.totp_config
+    if totp_config is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="2fa is not enabled, Kindly enable it first")
+    # the secret is only handed out while it is pending
+    if totp_config.is_enabled:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2FA is already enabled")
 
-    # return Response(content=qr_code, media_type="image/png")
+    # the image is a pure function of user and secret, so is the etag
+    etag = '"' + hashlib.sha256(f"{current_user.username}:{totp_config.secret_key}:{format}".encode()).hexdigest()[:32] + '"'
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=300"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-    return {
-        "message": "Scan QR code with Google authenticator",
-        "secret": totp_config.secret_key,
-        "qr_code": f"data:image/png;base64,{qr_code_base64}"
-    }
+    qr_code = await run_in_threadpool(
+        TwoFactorAuth.generate_qr_code,
+        current_user.username,
+        secret=totp_config.secret_key,
+        image_format=format
+    )
+    return Response(content=qr_code, media_type=QR_MEDIA_TYPES[format], headers=headers)
                                 
 @router.post('/2fa/verify', status_code=status.HTTP_200_OK)
-def verify_2fa(request: TOTPVerify, current_user: User = Depends(get_current_active_user), db: Session = Depends(get_db)):
+async def verify_2fa(request: TOTPVerify, current_user: User = Depends(get_current_user_with_totp), db: AsyncSession = Depends(get_async_db)):
+
+    totp_config = current_user.totp_config
 
-    if current_user.totp_config is None:
+    if totp_config is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2fa is not enabled, Kindly enable it first")
 
-    if current_user.totp_config.is_enabled:
+    if totp_config.is_enabled:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="2FA is already enabled")
     
-    secret_key = current_user.totp_config.secret_key
+    secret_key = totp_config.secret_key
     totp_code = request.totp_code
 
     is_valid = TwoFactorAuth.verify_totp_code(totp_code=totp_code, secret=secret_key)
@@ -236,19 +414,11 @@ def verify_2fa(request: TOTPVerify, current_user: User = Depends(get_current_act
     if not is_valid:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid 2FA code, please try again")
     
-    current_user.totp_config.is_enabled = True
-    db.commit()
+    totp_config.is_enabled = True
+    await db.commit()
+    TwoFactorAuth.forget_qr_codes(current_user.username, secret_key)
 
     return {
         "message": "2FA enabled successfully",
         "success": True
     }
-
-
-
-
-
-
-
-
-    
\ No newline at end of file
@@ -0,0 +1,19 @@
+# libraries
+from fastapi import APIRouter, Request
+from starlette.responses import Response
+
+# Local app modules
+from auth.keys import key_ring
+from config import Config
+
+router = APIRouter(tags=['jwks'])
+
+# public verification keys, resource servers validate our tokens locally with these
+@router.get('/.well-known/jwks.json')
+async def jwks(request: Request):
+    headers = {"Cache-Control": f"public, max-age={Config.JWKS_MAX_AGE}"}
+    if key_ring.jwks_etag:
+        headers["ETag"] = key_ring.jwks_etag
+        if request.headers.get("if-none-match") == key_ring.jwks_etag:
+            return Response(status_code=304, headers=headers)
+    return Response(content=key_ring.jwks_body, media_type="application/json", headers=headers)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, model_validator
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -24,6 +24,9 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# built once at import, not per call
+user_list_adapter = TypeAdapter(list[UserResponse])
+
 class UserCreateResponse(BaseModel):
     message: str
     data: UserResponse
@@ -31,9 +34,35 @@ class UserCreateResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: str | None = None
+    # claims minted at login, None for tokens issued without them
+    role: str | None = None
+    is_verified: bool | None = None
+    token_version: int | None = None
+    jti: str | None = None
+    exp: int | None = None
+    # refresh token family of the login
+    sid: str | None = None
+
+class UserPrincipal(BaseModel):
+    # detached snapshot of the authenticated user, safe to cache between requests
+    id: int
+    username: str
+    email: str
+    role: str
+    is_verified: bool
+    created_at: datetime
+    token_version: int
+
+    class Config:
+        from_attributes = True
+        frozen = True
 
 class PasswordResetRequest(BaseModel):
     email: str
@@ -42,5 +71,16 @@ class ResetPassword(BaseModel):
     new_password: str
     confirm_password: str
 
+class RevokeTokenRequest(BaseModel):
+    # a single token by jti, or every token of a user
+    jti: str | None = None
+    username: str | None = None
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.jti is None) == (self.username is None):
+            raise ValueError("provide exactly one of jti or username")
+        return self
+
 class TOTPVerify(BaseModel):
     totp_code: str = Field(min_length=6, max_length=6)
\ No newline at end of file
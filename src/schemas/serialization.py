@@ -0,0 +1,68 @@
+from datetime import datetime
+import json
+from fastapi.datastructures import Default
+from starlette.responses import JSONResponse
+from schemas.schemas import UserResponse, user_list_adapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Routes with a response_model are already dumped to bytes by pydantic-core inside
+# FastAPI, as long as the app keeps a *default* response class. What is left to
+# speed up are the routes that return plain dicts and the user listing, which
+# returns raw rows and does not need them validated into UserResponse first.
+
+# datetimes as pydantic writes them, UTC as "Z"
+ORJSON_OPTIONS = orjson.OPT_UTC_Z if orjson is not None else 0
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+# pass as FastAPI(default_response_class=...), wrapped in Default so FastAPI keeps
+# its pydantic fast path for the routes with a response_model
+default_response_class = Default(FastJSONResponse)
+
+
+def _as_dicts(rows) -> list[dict]:
+    # Row._asdict() is several times slower than zipping with the column names once
+    if not rows:
+        return []
+    fields = rows[0]._fields
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def dump_user_rows(rows) -> bytes:
+    """JSON array of UserResponse from rows of select(*USER_RESPONSE_COLUMNS).
+
+    The columns are already typed by the table, so the rows are written as they
+    are instead of being validated into UserResponse instances first.
+    """
+    if orjson is None:
+        return user_list_adapter.dump_json(user_list_adapter.validate_python(rows, from_attributes=True))
+    return orjson.dumps(_as_dicts(rows), option=ORJSON_OPTIONS)
+
+
+def dump_user_rows_ndjson(rows) -> bytes:
+    """Same as dump_user_rows, one object per line."""
+    if orjson is None:
+        return b"".join(UserResponse.model_validate(row).model_dump_json().encode() + b"\n" for row in rows)
+    return b"".join(orjson.dumps(row, option=ORJSON_OPTIONS) + b"\n" for row in _as_dicts(rows))
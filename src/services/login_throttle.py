@@ -0,0 +1,65 @@
+from services.ratelimit import create_backend, limiter
+from config import Config
+
+# Credential stuffing against one account spreads over many IPs, the IP limits
+# never see it, and every guess used to cost a full password hash. The throttle
+# counts failed logins per identifier over a sliding window and answers for a
+# blocked identifier before the user is even looked up.
+
+
+class LoginThrottle:
+    """Failed logins per identifier, with exponential backoff up to a temporary lockout.
+
+    The first `free_failures` failures within `window` seconds cost nothing, each
+    one after that blocks the identifier for `backoff` seconds, doubling with every
+    further failure, up to `lockout` seconds. A successful login clears it.
+    """
+
+    def __init__(self, backend, window: float, free_failures: int, backoff: float, lockout: float):
+        self.backend = backend
+        self.window = window
+        self.free_failures = free_failures
+        self.backoff = backoff
+        self.lockout = lockout
+
+    @staticmethod
+    def key(identifier: str) -> str:
+        # usernames are matched case-insensitively, so are their counters
+        return f"login:{identifier.strip().lower()}"
+
+    def delay(self, failures: int) -> float:
+        excess = failures - self.free_failures
+        if excess <= 0:
+            return 0.0
+        return min(self.backoff * 2 ** min(excess - 1, 32), self.lockout)
+
+    async def retry_after(self, identifier: str) -> float:
+        """Seconds until `identifier` may try again, 0 when it is not blocked."""
+        return await self.backend.blocked_for(self.key(identifier))
+
+    async def failure(self, identifier: str) -> float:
+        """Records a failed login, returns how long the identifier is now blocked."""
+        key = self.key(identifier)
+        delay = self.delay(await self.backend.add_failure(key, self.window))
+        if delay:
+            await self.backend.block(key, delay)
+        return delay
+
+    async def success(self, identifier: str):
+        await self.backend.clear(self.key(identifier))
+
+
+def _backend():
+    # same storage as the rate limits, one connection / client for both
+    if Config.LOGIN_THROTTLE_STORAGE == Config.RATE_LIMIT_STORAGE:
+        return limiter.backend
+    return create_backend(Config.LOGIN_THROTTLE_STORAGE)
+
+
+login_throttle = LoginThrottle(
+    _backend(),
+    window=Config.LOGIN_FAILURE_WINDOW,
+    free_failures=Config.LOGIN_FREE_FAILURES,
+    backoff=Config.LOGIN_BACKOFF_SECONDS,
+    lockout=Config.LOGIN_LOCKOUT_SECONDS
+)
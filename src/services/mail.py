@@ -1,22 +1,164 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from services.metrics import mail_time, mail_failures
 from config import Config
-import os
 
-def send_email(recipient: str, subject: str, body: str):
-    sender = Config.SMTP_EMAIL
-    password = Config.SMTP_PASSWORD
-    smtp_server = Config.SMTP_HOST
-    smtp_port = Config.SMTP_PORT
+# smtplib and the email package are imported on first use, the API processes
+# only queue emails and most of them never open an SMTP connection
+if TYPE_CHECKING:
+    import smtplib
+    from email.mime.multipart import MIMEMultipart
+
+# connections idle for longer than this get a NOOP before they are reused
+HEALTHCHECK_AFTER = 5
+
+
+class SMTPConnectionPool:
+    """Long lived, already authenticated SMTP connections.
+
+    Opening a connection costs the TCP connect, STARTTLS handshake and AUTH, so
+    connections are kept and reused for later messages. Broken connections are
+    dropped and replaced, idle ones are closed after `idle_timeout` seconds.
+    """
+
+    def __init__(self, host: str, port: int, username: str | None = None, password: str | None = None,
+                 size: int = 4, idle_timeout: float = 60, max_retries: int = 3, backoff: float = 0.5,
+                 starttls: bool = True, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.starttls = starttls
+        self.timeout = timeout
+        self._idle: list[tuple["smtplib.SMTP", float]] = []  # (connection, last used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username and self.password:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server: "smtplib.SMTP"):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_alive(server: "smtplib.SMTP") -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> "smtplib.SMTP":
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()  # most recently used first
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._close(server)
+            elif idle_for < HEALTHCHECK_AFTER or self._is_alive(server):
+                return server
+            else:
+                server.close()
+        return self._connect()
+
+    def _checkin(self, server: "smtplib.SMTP"):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception:
+                # state of the session is unknown, never hand it out again
+                server.close()
+                raise
+            self._checkin(server)
+
+    def send_messages(self, messages: list) -> None:
+        """Sends all messages over one session, reconnecting and retrying with backoff."""
+        import smtplib
+        pending = list(messages)
+        attempt = 0
+        start = time.perf_counter()
+        while pending:
+            try:
+                with self.connection() as server:
+                    while pending:
+                        server.send_message(pending[0])
+                        pending.pop(0)
+            except OSError as e:
+                # SMTPException is an OSError too, but a refused recipient, sender or
+                # message is refused again on retry, only transport failures are retried
+                retryable = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)
+                if isinstance(e, smtplib.SMTPException) and not isinstance(e, retryable):
+                    mail_failures.inc()
+                    raise
+                attempt += 1
+                if attempt > self.max_retries:
+                    mail_failures.inc()
+                    raise
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+        mail_time.observe(time.perf_counter() - start)
+
+    def close_idle(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+
+mail_pool = SMTPConnectionPool(
+    host=Config.SMTP_HOST,
+    port=Config.SMTP_PORT,
+    username=Config.SMTP_EMAIL,
+    password=Config.SMTP_PASSWORD,
+    size=Config.SMTP_POOL_SIZE,
+    idle_timeout=Config.SMTP_IDLE_TIMEOUT,
+    max_retries=Config.SMTP_MAX_RETRIES,
+    starttls=Config.SMTP_STARTTLS
+)
+
+
+def build_message(recipient: str, subject: str, body: str) -> "MIMEMultipart":
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
 
     msg = MIMEMultipart()
-    msg["From"] = sender
+    msg["From"] = Config.SMTP_EMAIL
     msg["To"] = recipient
     msg["Subject"] = subject
     msg.attach(MIMEText(body, "plain"))
+    return msg
+
+
+def send_email(recipient: str, subject: str, body: str):
+    mail_pool.send_messages([build_message(recipient, subject, body)])
+
 
-    with smtplib.SMTP(smtp_server, smtp_port) as server:
-        server.starttls()
-        server.login(sender, password)
-        server.sendmail(sender, recipient, msg.as_string())
\ No newline at end of file
+def send_batch(emails: list[dict]):
+    # each dict has recipient, subject and body, all go out over one session
+    mail_pool.send_messages([build_message(**email) for email in emails])
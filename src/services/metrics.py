@@ -0,0 +1,216 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Counters and histograms in the Prometheus text format, rendered by GET /metrics.
+# Recording is a dict lookup and an addition under a lock, scraping only walks
+# the series that exist, there is no background work.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [count per bucket (non cumulative, last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = 'le="' + str(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time from `collect`, which returns {label values: value}."""
+
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...], collect):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in self.collect().items()]
+        return lines
+
+
+class CounterFunc(Gauge):
+    """A counter kept by someone else, e.g. a cache, read at scrape time like a Gauge."""
+
+    type = "counter"
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "SQL statements executed per request", ("route",), buckets=COUNT_BUCKETS))
+request_db_time = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL per request", ("route",)))
+db_queries = registry.register(Histogram(
+    "db_query_duration_seconds", "SQL statement latency by database and statement type", ("database", "operation")))
+# password hashing runs in the hasher's process pool, only the pure hashing time is recorded
+crypto_time = registry.register(Histogram(
+    "auth_operation_duration_seconds", "Time of password hashing, token decoding and QR rendering", ("operation",)))
+hash_queue_time = registry.register(Histogram(
+    "password_hash_queue_seconds", "Time a password job waited for a free hashing process"))
+mail_time = registry.register(Histogram(
+    "mail_send_duration_seconds", "Time to hand messages to the SMTP server, per batch"))
+mail_failures = registry.register(Counter(
+    "mail_send_failures_total", "SMTP batches that failed, refused or still failing after all retries"))
+
+
+def register_cache(name: str, cache):
+    # hits and misses are counters kept by the cache itself, exposed as they are
+    registry.register(Gauge(
+        f"{name}_cache_entries", f"Entries in the {name} cache", (), lambda: {(): len(cache)}))
+    registry.register(CounterFunc(
+        f"{name}_cache_requests_total", f"Lookups in the {name} cache", ("result",),
+        lambda: {("hit",): cache.hits, ("miss",): cache.misses}))
+
+
+# per request SQL accounting, the middleware puts a fresh [queries, seconds] in the context
+request_queries: ContextVar[list | None] = ContextVar("request_queries", default=None)
+
+
+def instrument_engine(engine, database: str = "primary"):
+    """Times every statement on a sync engine (for an AsyncEngine pass .sync_engine).
+
+    `database` labels the statements, primary or replica.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        db_queries.observe(duration, database, statement.lstrip().split(None, 1)[0].upper())
+        stats = request_queries.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += duration
+
+
+class MetricsMiddleware:
+    """Latency and status per route template, and the SQL done while serving it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = [0, 0.0]
+        token = request_queries.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            request_queries.reset(token)
+            # the template, not the raw path, keeps the number of series bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(scope["method"], route, status_code)
+            http_latency.observe(duration, scope["method"], route)
+            request_db_queries.observe(stats[0], route)
+            request_db_time.observe(stats[1], route)
@@ -0,0 +1,101 @@
+import logging
+from datetime import datetime, timezone, timedelta
+from sqlalchemy import select, update, or_, and_
+from models.models import EmailOutbox
+from services.mail import mail_pool, build_message
+from services.metrics import mail_time, mail_failures
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+def message_errors() -> tuple:
+    # refusals of a single message, the smtp session can carry on with the next one
+    import smtplib
+    return (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+# Transactional outbox. Routes only insert a row next to their own change, the
+# worker in cli/outbox_worker.py claims pending rows and does the SMTP work.
+
+def enqueue_email(db, recipient: str, subject: str, body: str):
+    # only adds the row, it is committed together with the caller's changes
+    db.add(EmailOutbox(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        available_at=datetime.now(timezone.utc)
+    ))
+
+
+def claim_batch(db, size: int) -> list[EmailOutbox]:
+    now = datetime.now(timezone.utc)
+    # rows stuck in sending belong to a worker that died mid batch
+    claimable = or_(
+        and_(EmailOutbox.status == "pending", EmailOutbox.available_at <= now),
+        and_(EmailOutbox.status == "sending", EmailOutbox.locked_at <= now - timedelta(seconds=Config.OUTBOX_LOCK_TIMEOUT))
+    )
+    candidates = select(EmailOutbox.id).where(claimable).order_by(EmailOutbox.id).limit(size)
+    if db.get_bind().dialect.name == "postgresql":
+        # concurrent workers skip each other's rows instead of waiting on them
+        candidates = candidates.with_for_update(skip_locked=True)
+
+    # the claim condition is repeated, a row taken by another worker in between is not claimed twice
+    claimed = db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(candidates.scalar_subquery()), claimable)
+        .values(status="sending", locked_at=now)
+        .returning(EmailOutbox.id)
+    ).scalars().all()
+    db.commit()
+    if not claimed:
+        return []
+    return db.scalars(select(EmailOutbox).where(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id)).all()
+
+
+def _record_failure(email: EmailOutbox, error: Exception, now: datetime):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"
+    email.locked_at = None
+    if email.attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+        email.status = "failed"
+    else:
+        email.status = "pending"
+        email.available_at = now + timedelta(seconds=Config.OUTBOX_RETRY_SECONDS * 2 ** (email.attempts - 1))
+
+
+def dispatch_batch(db, size: int) -> int:
+    """Claims up to `size` emails and sends them over one pooled SMTP session, returns how many were claimed."""
+    emails = claim_batch(db, size)
+    if not emails:
+        return 0
+    refused = message_errors()
+
+    try:
+        with mail_time.time(), mail_pool.connection() as server:
+            for email in emails:
+                now = datetime.now(timezone.utc)
+                try:
+                    server.send_message(build_message(email.recipient, email.subject, email.body))
+                except refused as e:
+                    # this message was refused, the session itself is still usable
+                    _record_failure(email, e, now)
+                except Exception as e:
+                    _record_failure(email, e, now)
+                    raise
+                else:
+                    email.attempts += 1
+                    email.status = "sent"
+                    email.sent_at = now
+                    email.locked_at = None
+    except Exception:
+        mail_failures.inc()
+        logger.exception("smtp session failed, releasing the rest of the batch")
+        retry_at = datetime.now(timezone.utc) + timedelta(seconds=Config.OUTBOX_RETRY_SECONDS)
+        for email in emails:
+            if email.status == "sending":
+                # not attempted, so it does not count against OUTBOX_MAX_ATTEMPTS
+                email.status = "pending"
+                email.locked_at = None
+                email.available_at = retry_at
+    db.commit()
+    return len(emails)
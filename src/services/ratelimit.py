@@ -0,0 +1,327 @@
+import itertools
+import logging
+import math
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from fastapi import HTTPException, Request, status
+from starlette.responses import JSONResponse
+from config import Config, SRC_DIR
+
+logger = logging.getLogger(__name__)
+
+# Token bucket rate limiting, implemented as GCRA: instead of a token count every
+# key stores a single "theoretical arrival time" (tat). Each hit moves it forward
+# by one interval (period / count), and a hit is rejected when that would put it
+# more than a full bucket (count intervals) ahead of now. One value per key means
+# every backend can check and update it in a single atomic operation.
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> tuple[int, int]:
+    """"5/minute" -> (5, 60)"""
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period.strip().rstrip("s")]
+
+
+class MemoryBackend:
+    # per process only, for tests and single worker deployments
+
+    def __init__(self):
+        self._tat: dict[str, float] = {}
+        self._failures: dict[str, list[float]] = {}
+        self._blocked: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str, interval: float, limit: float) -> float:
+        now = time.time()
+        with self._lock:
+            new_tat = max(self._tat.get(key, now), now) + interval
+            if new_tat - now > limit:
+                return new_tat - now - limit
+            self._tat[key] = new_tat
+            if len(self._tat) > 100_000:
+                # keys whose bucket is full again carry no state
+                self._tat = {k: tat for k, tat in self._tat.items() if tat > now}
+        return 0.0
+
+    # failure log of the login throttle, see services/login_throttle.py
+
+    async def add_failure(self, key: str, window: float) -> int:
+        now = time.time()
+        with self._lock:
+            failures = [t for t in self._failures.get(key, ()) if t > now - window]
+            failures.append(now)
+            self._failures[key] = failures
+            if len(self._failures) > 100_000:
+                self._failures = {k: f for k, f in self._failures.items() if f[-1] > now - window}
+        return len(failures)
+
+    async def block(self, key: str, seconds: float):
+        now = time.time()
+        with self._lock:
+            self._blocked[key] = max(self._blocked.get(key, 0.0), now + seconds)
+            if len(self._blocked) > 100_000:
+                self._blocked = {k: until for k, until in self._blocked.items() if until > now}
+
+    async def blocked_for(self, key: str) -> float:
+        return max(self._blocked.get(key, 0.0) - time.time(), 0.0)
+
+    async def clear(self, key: str):
+        with self._lock:
+            self._failures.pop(key, None)
+            self._blocked.pop(key, None)
+
+
+class SQLiteBackend:
+    """Shared by every worker process on the host through one sqlite file.
+
+    The statements run inline on the event loop, each one a short autocommit
+    transaction, a threadpool hop would cost several times the SQL itself. A lock
+    held by another worker is waited for at most `timeout` seconds, after that the
+    counters are skipped for this call rather than stall the loop.
+    """
+
+    HIT = """
+        INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval)
+        ON CONFLICT (key) DO UPDATE SET tat = max(tat, :now) + :interval
+        WHERE max(tat, :now) + :interval - :now <= :limit
+        RETURNING tat
+    """
+    PRUNE_EVERY = 1000  # hits between two deletes of the keys whose bucket is full again
+
+    def __init__(self, path: str, timeout: float = 0.05):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._hits = itertools.count(1)
+        # created at import, in the process cli/serve.py forks its workers from, so the
+        # connection is closed again, the workers connect on their first request. Startup
+        # can afford to wait for a worker that creates the same tables.
+        with closing(sqlite3.connect(self.path, isolation_level=None, timeout=5)) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS login_failures (key TEXT NOT NULL, failed_at REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_login_failures_key ON login_failures (key, failed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_login_failures_failed_at ON login_failures (failed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS login_blocks (key TEXT PRIMARY KEY, blocked_until REAL NOT NULL)")
+
+    def reset(self):
+        # forgets the connections of this process without closing them, for a forked
+        # child, sqlite connections must never be used across a fork
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # autocommit, every statement is its own transaction
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=self.timeout, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # counters are disposable, no need to fsync them
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _hit(self, key: str, interval: float, limit: float) -> float:
+        now = time.time()
+        conn = self._connection()
+        if next(self._hits) % self.PRUNE_EVERY == 0:
+            # a key whose tat has passed behaves exactly like a missing key
+            conn.execute("DELETE FROM rate_limits WHERE tat < ?", (now,))
+        if conn.execute(self.HIT, {"key": key, "now": now, "interval": interval, "limit": limit}).fetchone():
+            return 0.0
+        # rejected, only now is the current tat needed for Retry-After
+        (tat,) = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return max(tat, now) + interval - now - limit
+
+    def _add_failure(self, key: str, window: float) -> int:
+        now = time.time()
+        conn = self._connection()
+        # every key uses the same window, so anything older can go, whatever its key
+        conn.execute("DELETE FROM login_failures WHERE failed_at <= ?", (now - window,))
+        conn.execute("INSERT INTO login_failures (key, failed_at) VALUES (?, ?)", (key, now))
+        (count,) = conn.execute("SELECT count(*) FROM login_failures WHERE key = ?", (key,)).fetchone()
+        return count
+
+    def _block(self, key: str, seconds: float):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("DELETE FROM login_blocks WHERE blocked_until <= ?", (now,))
+        conn.execute(
+            "INSERT INTO login_blocks (key, blocked_until) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET blocked_until = max(blocked_until, excluded.blocked_until)",
+            (key, now + seconds)
+        )
+
+    def _blocked_for(self, key: str) -> float:
+        row = self._connection().execute("SELECT blocked_until FROM login_blocks WHERE key = ?", (key,)).fetchone()
+        return max(row[0] - time.time(), 0.0) if row else 0.0
+
+    def _clear(self, key: str):
+        conn = self._connection()
+        conn.execute("DELETE FROM login_failures WHERE key = ?", (key,))
+        conn.execute("DELETE FROM login_blocks WHERE key = ?", (key,))
+
+    def _call(self, method, default, *args):
+        try:
+            return method(*args)
+        except sqlite3.OperationalError:
+            # still locked after the busy timeout, the counters are best effort
+            logger.warning("%s busy, %s skipped", self.path, method.__name__)
+            return default
+
+    async def hit(self, key: str, interval: float, limit: float) -> float:
+        return self._call(self._hit, 0.0, key, interval, limit)
+
+    async def add_failure(self, key: str, window: float) -> int:
+        return self._call(self._add_failure, 0, key, window)
+
+    async def block(self, key: str, seconds: float):
+        self._call(self._block, None, key, seconds)
+
+    async def blocked_for(self, key: str) -> float:
+        return self._call(self._blocked_for, 0.0, key)
+
+    async def clear(self, key: str):
+        self._call(self._clear, None, key)
+
+
+class RedisBackend:
+    """Shared across hosts, any server speaking the redis protocol works."""
+
+    # time comes from the server so every node agrees on it
+    SCRIPT = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local interval = tonumber(ARGV[1])
+        local limit = tonumber(ARGV[2])
+        local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+        local new_tat = math.max(tat, now) + interval
+        if new_tat - now > limit then
+            return tostring(new_tat - now - limit)
+        end
+        redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+        return '0'
+    """
+
+    # sorted set of failure times, trimmed to the window on every failure
+    ADD_FAILURE = """
+        local now_parts = redis.call('TIME')
+        local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+        local window = tonumber(ARGV[1])
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+        redis.call('ZADD', KEYS[1], now, ARGV[2])
+        redis.call('PEXPIRE', KEYS[1], math.ceil(window * 1000))
+        return redis.call('ZCARD', KEYS[1])
+    """
+
+    # the block is a key that expires when the block ends, it is only ever extended
+    BLOCK = """
+        local ms = tonumber(ARGV[1])
+        if redis.call('PTTL', KEYS[1]) < ms then
+            redis.call('SET', KEYS[1], '1', 'PX', ms)
+        end
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_STORAGE uses redis, install the redis package")
+        self.client = redis.from_url(url)
+        self._script = self.client.register_script(self.SCRIPT)
+        self._add_failure = self.client.register_script(self.ADD_FAILURE)
+        self._block = self.client.register_script(self.BLOCK)
+
+    async def hit(self, key: str, interval: float, limit: float) -> float:
+        return float(await self._script(keys=[f"ratelimit:{key}"], args=[interval, limit]))
+
+    async def add_failure(self, key: str, window: float) -> int:
+        return int(await self._add_failure(keys=[f"failures:{key}"], args=[window, uuid.uuid4().hex]))
+
+    async def block(self, key: str, seconds: float):
+        await self._block(keys=[f"blocked:{key}"], args=[math.ceil(seconds * 1000)])
+
+    async def blocked_for(self, key: str) -> float:
+        return max(await self.client.pttl(f"blocked:{key}"), 0) / 1000
+
+    async def clear(self, key: str):
+        await self.client.delete(f"failures:{key}", f"blocked:{key}")
+
+
+def create_backend(storage: str):
+    if storage.startswith("memory://"):
+        return MemoryBackend()
+    if storage.startswith("sqlite:///"):
+        # a relative path is relative to src/, not to wherever the server was started
+        return SQLiteBackend(str(SRC_DIR / storage[len("sqlite:///"):]))
+    if storage.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(storage)
+    raise ValueError(f"Unsupported RATE_LIMIT_STORAGE {storage!r}")
+
+
+class RateLimiter:
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def hit(self, key: str, rate: str) -> float:
+        """Takes one token for `key`, returns 0 when allowed, otherwise seconds until retry."""
+        count, period = parse_rate(rate)
+        interval = period / count
+        return await self.backend.hit(key, interval, interval * count)
+
+
+limiter = RateLimiter(create_backend(Config.RATE_LIMIT_STORAGE))
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _too_many_requests(retry_after: float) -> dict:
+    return {"Retry-After": str(math.ceil(retry_after))}
+
+
+class RateLimit:
+    # per route budget, e.g. dependencies=[Depends(RateLimit("login", Config.RATE_LIMIT_LOGIN))]
+    def __init__(self, scope: str, rate: str):
+        self.scope = scope
+        self.rate = rate
+
+    async def __call__(self, request: Request):
+        if not Config.RATE_LIMIT_ENABLED:
+            return
+        retry_after = await limiter.hit(f"{self.scope}:{client_ip(request)}", self.rate)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded: {self.rate}",
+                headers=_too_many_requests(retry_after)
+            )
+
+
+class RateLimitMiddleware:
+    """IP based default budget shared by all routes, except the exempt paths."""
+
+    def __init__(self, app, rate: str, exempt: tuple[str, ...] = ()):
+        self.app = app
+        self.rate = rate
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Config.RATE_LIMIT_ENABLED or scope["path"] in self.exempt:
+            return await self.app(scope, receive, send)
+
+        client = scope.get("client")
+        retry_after = await limiter.hit(f"default:{client[0] if client else 'unknown'}", self.rate)
+        if retry_after:
+            response = JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"error": f"Rate limit exceeded: {self.rate}"},
+                headers=_too_many_requests(retry_after)
+            )
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
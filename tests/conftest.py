@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# the app imports its modules relative to src/, same as alembic/env.py
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# settings without defaults, so the test suite runs without a src/.env
+os.environ.setdefault("JWT_SECRET_KEY", "test-jwt-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("JWT_ALGO", "HS256")
+os.environ.setdefault("TOKEN_SECRET_KEY", "test-token-secret")
+os.environ.setdefault("FRONTEND_URL", "http://localhost:3000")
+os.environ.setdefault("SMTP_EMAIL", "noreply@example.com")
+os.environ.setdefault("SMTP_PASSWORD", "password")
+os.environ.setdefault("SMTP_HOST", "localhost")
+os.environ.setdefault("SMTP_PORT", "2525")
+os.environ.setdefault("RATE_LIMIT_STORAGE", "memory://")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{Path(tempfile.mkdtemp()) / 'test.db'}")
+# cheap hashes, the suite does not test the cost itself
+os.environ.setdefault("BCRYPT_ROUNDS", "5")
+
+
+@pytest.fixture
+def app_users() -> list[dict]:
+    """Users the `client` fixture seeds, override it in a test module for other ones."""
+    return [{"username": "user", "email": "user@example.com", "password": "secret123", "is_verified": True}]
+
+
+@pytest.fixture
+def client(app_users, monkeypatch):
+    """TestClient of the app on freshly created tables, seeded with `app_users` (plain passwords)."""
+    from fastapi.testclient import TestClient
+    from sqlalchemy import insert
+    from auth.utils import hash_password
+    from config import Config
+    from database.database import Base, engine
+    from models.models import User
+
+    # the per IP budgets would stop a module that logs in more than a few times
+    monkeypatch.setattr(Config, "RATE_LIMIT_ENABLED", False)
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # one statement per user, an executemany would take its columns from the first one only
+        for user in app_users:
+            conn.execute(insert(User).values(**{**user, "password": hash_password(user["password"])}))
+    from main import app
+    with TestClient(app) as client:
+        yield client
+    Base.metadata.drop_all(engine)
+
+
+class SMTPRecorder:
+    """aiosmtpd handler that accepts every message and remembers it."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+class SMTPRefuser(SMTPRecorder):
+    """aiosmtpd handler that refuses every message after its DATA."""
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "554 Message rejected"
+
+
+@pytest.fixture
+def free_port() -> int:
+    """A local port nothing listens on."""
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _smtp_server(handler, port: int):
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+@pytest.fixture
+def smtp_server(free_port):
+    """(controller, SMTPRecorder) of a local SMTP server, skipped without aiosmtpd."""
+    yield from _smtp_server(SMTPRecorder(), free_port)
+
+
+@pytest.fixture
+def refusing_smtp_server(free_port):
+    """(controller, SMTPRefuser) of a local SMTP server that refuses every message."""
+    yield from _smtp_server(SMTPRefuser(), free_port)
+
+
+@pytest.fixture
+def make_pool():
+    """Builds an SMTPConnectionPool for a server of the fixtures above."""
+    from services.mail import SMTPConnectionPool
+
+    def make_pool(controller, **kwargs):
+        return SMTPConnectionPool(host=controller.hostname, port=controller.port, starttls=False, **kwargs)
+    return make_pool
@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import select
+
+from database.database import sessionLocal
+from models.models import EmailOutbox, User
+
+
+@pytest.fixture
+def app_users():
+    return [{"username": "Foo", "email": "Foo@Example.com", "password": "secret123", "is_verified": True}]
+
+
+@pytest.mark.parametrize("username, email", [
+    ("foo", "other@example.com"),
+    ("FOO", "other@example.com"),
+    ("other", "foo@example.com"),
+    ("other", "FOO@EXAMPLE.COM"),
+])
+def test_register_rejects_names_differing_only_in_case(client, username, email):
+    response = client.post("/register/", json={"username": username, "email": email, "password": "secret123"})
+    assert response.status_code == 409
+
+    with sessionLocal() as db:
+        assert db.scalars(select(User.username)).all() == ["Foo"]
+
+
+@pytest.mark.parametrize("username", ["foo", "FOO", "Foo"])
+def test_login_matches_the_username_case_insensitively(client, username):
+    response = client.post("/login", data={"username": username, "password": "secret123"})
+    assert response.status_code == 200
+
+
+def test_forget_password_matches_the_email_case_insensitively(client):
+    response = client.put("/forget-password", json={"email": "FOO@example.COM"})
+    assert response.status_code == 200
+
+    with sessionLocal() as db:
+        # the link goes to the address as it was registered
+        assert db.scalars(select(EmailOutbox.recipient)).all() == ["Foo@Example.com"]
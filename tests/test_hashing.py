@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from auth.hashing import PasswordHasher
+
+
+def test_rejects_when_the_queue_is_full():
+    hasher = PasswordHasher(workers=2, max_pending=4, latency_budget_ms=10_000)
+    hasher.avg_duration = 0.1
+    hasher.pending = 4
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(hasher.verify("secret", "hash"))
+    assert error.value.status_code == 503
+    # 4 queued jobs over 2 workers, plus our own: 3 rounds of 0.1 s
+    assert error.value.headers["Retry-After"] == "1"
+    # rejected before anything was queued or a worker process was started
+    assert hasher.pending == 4
+    assert hasher._executor is None
+
+
+def test_rejects_when_the_wait_exceeds_the_latency_budget():
+    hasher = PasswordHasher(workers=1, max_pending=64, latency_budget_ms=1000)
+    hasher.avg_duration = 0.25
+    hasher.pending = 3
+    assert hasher.estimated_wait() == 1.0
+    hasher._admit()  # exactly at the budget is still admitted
+
+    hasher.pending = 4
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(hasher.hash("secret"))
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "2"
@@ -0,0 +1,27 @@
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from auth.jwt import create_access_token, decode_token, token_cache
+
+
+def test_decode_is_served_from_cache():
+    token_cache.clear()
+    token = create_access_token({"sub": "alice"})
+    hits = token_cache.hits
+    assert decode_token(token)["sub"] == "alice"
+    assert decode_token(token)["sub"] == "alice"
+    assert token_cache.hits == hits + 1
+
+
+def test_expired_token_is_not_cached():
+    token_cache.clear()
+    token = create_access_token({"sub": "alice"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException):
+        decode_token(token)
+    assert len(token_cache) == 0
+
+
+def test_cached_payload_is_a_copy():
+    token = create_access_token({"sub": "alice"})
+    decode_token(token)["sub"] = "mallory"
+    assert decode_token(token)["sub"] == "alice"
@@ -0,0 +1,55 @@
+import json
+import os
+import time
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from auth.keys import KeyRing
+
+
+def write_private_key(path, key):
+    path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ))
+
+
+def test_hmac_uses_shared_secret():
+    ring = KeyRing(algorithm="HS256", secret="secret")
+    assert ring.signing_key() == (None, "secret")
+    assert ring.verification_key(None) == "secret"
+    assert json.loads(ring.jwks_body) == {"keys": []}
+
+
+def test_rotation_keeps_old_key_for_verification(tmp_path):
+    old = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    new = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    (tmp_path / "old.pub.pem").write_bytes(old.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ))
+    write_private_key(tmp_path / "new.pem", new)
+
+    ring = KeyRing(algorithm="RS256", secret="unused", keys_dir=str(tmp_path))
+    kid, key = ring.signing_key()
+    assert kid == "new"
+
+    old_token = jwt.encode({"sub": "alice"}, old, algorithm="RS256", headers={"kid": "old"})
+    assert jwt.decode(old_token, ring.verification_key("old"), algorithms=["RS256"])["sub"] == "alice"
+    assert ring.verification_key("missing") is None
+    assert [k["kid"] for k in json.loads(ring.jwks_body)["keys"]] == ["new", "old"]
+
+
+def test_active_kid_defaults_to_newest_private_key(tmp_path):
+    write_private_key(tmp_path / "a.pem", ed25519.Ed25519PrivateKey.generate())
+    write_private_key(tmp_path / "b.pem", ed25519.Ed25519PrivateKey.generate())
+    os.utime(tmp_path / "a.pem", (time.time() - 60, time.time() - 60))
+    assert KeyRing(algorithm="EdDSA", secret="", keys_dir=str(tmp_path)).signing_kid == "b"
+    assert KeyRing(algorithm="EdDSA", secret="", keys_dir=str(tmp_path), active_kid="a").signing_kid == "a"
+
+
+def test_missing_keys_dir_fails_fast():
+    with pytest.raises(RuntimeError):
+        KeyRing(algorithm="RS256", secret="")
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from auth.hashing import password_hasher
+from config import Config
+from database.database import sessionLocal
+from models.models import User
+from services.login_throttle import LoginThrottle, login_throttle
+from services.ratelimit import MemoryBackend, SQLiteBackend
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def throttle(request, tmp_path):
+    backend = MemoryBackend() if request.param == "memory" else SQLiteBackend(str(tmp_path / "ratelimit.db"))
+    return LoginThrottle(backend, window=60, free_failures=2, backoff=1, lockout=4)
+
+
+def test_backoff_doubles_up_to_the_lockout(throttle):
+    async def run():
+        delays = [await throttle.failure("Alice") for _ in range(6)]
+        return delays, await throttle.retry_after("alice")
+
+    delays, retry_after = asyncio.run(run())
+    assert delays == [0, 0, 1, 2, 4, 4]
+    assert 3 < retry_after <= 4
+
+
+def test_success_clears_the_identifier(throttle):
+    async def run():
+        for _ in range(3):
+            await throttle.failure("bob")
+        await throttle.success("BOB")
+        return await throttle.retry_after("bob"), await throttle.failure("bob")
+
+    assert asyncio.run(run()) == (0, 0)
+
+
+@pytest.fixture
+def app_users():
+    return [{"username": "stuffed", "email": "stuffed@example.com", "password": "secret123", "is_verified": True}]
+
+
+def test_blocked_login_is_rejected_before_hashing(client, monkeypatch):
+    for _ in range(Config.LOGIN_FREE_FAILURES + 1):
+        assert client.post("/login", data={"username": "stuffed", "password": "guess"}).status_code == 401
+
+    hashed = []
+    verify = password_hasher.verify_and_update
+    monkeypatch.setattr(password_hasher, "verify_and_update", lambda *args: hashed.append(args) or verify(*args))
+
+    response = client.post("/login", data={"username": "Stuffed", "password": "secret123"})
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert not hashed
+
+    with sessionLocal() as db:
+        user = db.scalar(select(User).where(User.username == "stuffed"))
+        assert user.failed_login_count == Config.LOGIN_FREE_FAILURES + 1
+        assert user.locked_until is not None
+
+    # a worker without the counters still sees the lock on the row
+    asyncio.run(login_throttle.backend.clear(login_throttle.key("stuffed")))
+    assert client.post("/login", data={"username": "stuffed", "password": "secret123"}).status_code == 429
+    assert not hashed
@@ -0,0 +1,45 @@
+import smtplib
+import socket
+import pytest
+from services.mail import SMTPConnectionPool, build_message
+
+
+def test_messages_reuse_one_session(smtp_server, make_pool):
+    controller, handler = smtp_server
+    pool = make_pool(controller, size=1)
+    pool.send_messages([build_message("a@example.com", "one", "body")])
+    pool.send_messages([build_message("b@example.com", "two", "body")])
+    pool.send_messages([build_message(f"{i}@example.com", "batch", "body") for i in range(3)])
+    pool.close_idle()
+
+    assert len(handler.messages) == 5
+    assert len(handler.sessions) == 1
+
+
+def test_reconnects_after_the_connection_drops(smtp_server, make_pool):
+    controller, handler = smtp_server
+    pool = make_pool(controller, backoff=0)
+    pool.send_messages([build_message("a@example.com", "one", "body")])
+
+    # the pooled connection dies, e.g. the server restarted or a proxy dropped it
+    for server, _ in pool._idle:
+        server.sock.shutdown(socket.SHUT_RDWR)
+    pool.send_messages([build_message("b@example.com", "two", "body")])
+
+    assert len(handler.messages) == 2
+    assert len(handler.sessions) == 2
+
+
+def test_gives_up_after_retries(free_port):
+    pool = SMTPConnectionPool(host="127.0.0.1", port=free_port, starttls=False, max_retries=1, backoff=0)
+    with pytest.raises(OSError):
+        pool.send_messages([build_message("a@example.com", "one", "body")])
+
+
+def test_refused_message_is_not_retried(refusing_smtp_server, make_pool):
+    controller, handler = refusing_smtp_server
+    pool = make_pool(controller, backoff=0)
+    with pytest.raises(smtplib.SMTPDataError):
+        pool.send_messages([build_message("a@example.com", "one", "body")])
+
+    assert len(handler.messages) == 1
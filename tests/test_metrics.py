@@ -0,0 +1,40 @@
+from services import metrics
+from services.metrics import Counter, Histogram, Registry
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "test", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "/login")
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/login",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/login",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/login",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/login"} 3' in lines
+
+
+def test_registry_renders_counters_with_escaped_labels():
+    registry = Registry()
+    counter = registry.register(Counter("requests_total", "test", ("route",)))
+    counter.inc('/a"b')
+    counter.inc('/a"b')
+    text = registry.render()
+    assert "# TYPE requests_total counter" in text
+    assert 'requests_total{route="/a\\"b"} 2' in text
+
+
+def test_cache_lookups_are_exported_as_counters(monkeypatch):
+    class Cache:
+        hits, misses = 3, 1
+
+        def __len__(self):
+            return 2
+
+    monkeypatch.setattr(metrics, "registry", Registry())
+    metrics.register_cache("test", Cache())
+    text = metrics.registry.render()
+    assert "# TYPE test_cache_entries gauge" in text
+    assert "test_cache_entries 2" in text
+    assert "# TYPE test_cache_requests_total counter" in text
+    assert 'test_cache_requests_total{result="hit"} 3' in text
+    assert 'test_cache_requests_total{result="miss"} 1' in text
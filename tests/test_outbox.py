@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from config import Config
+from database.database import Base, engine, sessionLocal
+from models.models import EmailOutbox, User
+from services import outbox
+from services.outbox import claim_batch, dispatch_batch, enqueue_email
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    with sessionLocal() as session:
+        yield session
+    Base.metadata.drop_all(engine)
+
+
+def _enqueue(db, count: int) -> list[int]:
+    for i in range(count):
+        enqueue_email(db, recipient=f"{i}@example.com", subject="subject", body="body")
+    db.commit()
+    return db.scalars(select(EmailOutbox.id).order_by(EmailOutbox.id)).all()
+
+
+def _utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def test_pending_rows_are_claimed_once(db):
+    ids = _enqueue(db, 3)
+    db.execute(update(EmailOutbox).where(EmailOutbox.id == ids[2])
+               .values(available_at=datetime.now(timezone.utc) + timedelta(minutes=1)))
+    db.commit()
+
+    claimed = claim_batch(db, 10)
+    assert [email.id for email in claimed] == ids[:2]
+    assert {email.status for email in claimed} == {"sending"}
+    # a second worker polling right after finds nothing left
+    assert claim_batch(db, 10) == []
+
+
+def test_rows_stuck_in_sending_are_reclaimed(db):
+    (email_id,) = _enqueue(db, 1)
+    assert len(claim_batch(db, 10)) == 1
+
+    # the worker that claimed it died before sending
+    stale = datetime.now(timezone.utc) - timedelta(seconds=Config.OUTBOX_LOCK_TIMEOUT + 1)
+    db.execute(update(EmailOutbox).where(EmailOutbox.id == email_id).values(locked_at=stale))
+    db.commit()
+
+    assert [email.id for email in claim_batch(db, 10)] == [email_id]
+
+
+def test_claimed_rows_are_sent(db, smtp_server, make_pool, monkeypatch):
+    controller, handler = smtp_server
+    monkeypatch.setattr(outbox, "mail_pool", make_pool(controller))
+    _enqueue(db, 2)
+
+    assert dispatch_batch(db, 10) == 2
+    assert len(handler.messages) == 2
+    db.expire_all()
+    assert set(db.scalars(select(EmailOutbox.status))) == {"sent"}
+
+
+def test_refused_message_backs_off_then_fails(db, refusing_smtp_server, make_pool, monkeypatch):
+    controller, handler = refusing_smtp_server
+    monkeypatch.setattr(Config, "OUTBOX_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(outbox, "mail_pool", make_pool(controller))
+    (email_id,) = _enqueue(db, 1)
+
+    before = datetime.now(timezone.utc)
+    assert dispatch_batch(db, 10) == 1
+    email = db.get(EmailOutbox, email_id)
+    assert (email.status, email.attempts) == ("pending", 1)
+    assert email.last_error.startswith("SMTPDataError")
+    assert _utc(email.available_at) >= before + timedelta(seconds=Config.OUTBOX_RETRY_SECONDS)
+    # backing off, not claimed before available_at
+    assert dispatch_batch(db, 10) == 0
+
+    email.available_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+    assert dispatch_batch(db, 10) == 1
+
+    db.refresh(email)
+    assert (email.status, email.attempts) == ("failed", 2)
+    assert len(handler.messages) == 2
+    # failed rows are never claimed again
+    email.available_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.commit()
+    assert claim_batch(db, 10) == []
+
+
+@pytest.fixture
+def app_users():
+    return [{"username": "taken", "email": "taken@example.com", "password": "secret123", "is_verified": True}]
+
+
+def test_register_commits_the_user_with_its_email(client):
+    response = client.post("/register/", json={"username": "new", "email": "new@example.com", "password": "secret123"})
+    assert response.status_code == 201
+    # rejected by the unique index, the rollback takes its queued email with it
+    response = client.post("/register/", json={"username": "taken", "email": "other@example.com", "password": "secret123"})
+    assert response.status_code == 409
+
+    with sessionLocal() as db:
+        assert db.scalars(select(User.username).order_by(User.id)).all() == ["taken", "new"]
+        assert db.scalars(select(EmailOutbox.recipient)).all() == ["new@example.com"]
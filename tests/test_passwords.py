@@ -0,0 +1,21 @@
+from passlib.hash import bcrypt
+
+from auth.utils import hash_password, verify_and_update_password
+from config import Config
+
+
+def test_current_policy_hash_is_not_updated():
+    valid, new_hash = verify_and_update_password("secret123", hash_password("secret123"))
+    assert valid and new_hash is None
+
+
+def test_old_cost_hash_is_rehashed_to_current_rounds():
+    old_hash = bcrypt.using(rounds=4).hash("secret123")
+    valid, new_hash = verify_and_update_password("secret123", old_hash)
+    assert valid
+    assert bcrypt.from_string(new_hash).rounds == Config.BCRYPT_ROUNDS
+
+
+def test_wrong_password_is_not_rehashed():
+    old_hash = bcrypt.using(rounds=4).hash("secret123")
+    assert verify_and_update_password("wrong", old_hash) == (False, None)
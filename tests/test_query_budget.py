@@ -0,0 +1,38 @@
+import pytest
+
+from database.profiler import assert_max_queries, current_profile, profile_request
+
+
+def test_profile_ends_with_the_request():
+    with profile_request("outer") as outer:
+        with profile_request("nested") as nested:
+            assert nested is outer
+        assert current_profile.get() is outer
+    assert current_profile.get() is None
+
+
+@pytest.fixture
+def app_users():
+    return [{"username": "budget", "email": "budget@example.com", "password": "secret123", "is_verified": True}]
+
+
+def test_2fa_routes_load_user_and_totp_config_together(client):
+    token = client.post("/login", data={"username": "budget", "password": "secret123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    # the user with its totp_config, then the insert of the pending secret
+    with assert_max_queries(2) as profile:
+        assert client.post("/2fa/enable", params={"inline_qr": False}, headers=headers).status_code == 200
+    assert not profile.relationship_loads
+
+    with assert_max_queries(1):
+        assert client.get("/2fa/qr", headers=headers).status_code == 200
+
+
+def test_protected_route_is_served_from_the_principal_cache(client):
+    token = client.post("/login", data={"username": "budget", "password": "secret123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    client.get("/protected", headers=headers)
+
+    with assert_max_queries(0):
+        assert client.get("/protected", headers=headers).status_code == 200
@@ -0,0 +1,71 @@
+import asyncio
+import sqlite3
+import pytest
+from services.ratelimit import MemoryBackend, SQLiteBackend, RateLimiter, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("5/minute") == (5, 60)
+    assert parse_rate("100/day") == (100, 86400)
+    assert parse_rate("2/seconds") == (2, 1)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def limiter(request, tmp_path):
+    if request.param == "memory":
+        return RateLimiter(MemoryBackend())
+    return RateLimiter(SQLiteBackend(str(tmp_path / "ratelimit.db")))
+
+
+def test_bucket_allows_burst_then_rejects(limiter):
+    async def run():
+        results = [await limiter.hit("login:1.2.3.4", "3/minute") for _ in range(4)]
+        other = await limiter.hit("login:5.6.7.8", "3/minute")
+        return results, other
+
+    results, other = asyncio.run(run())
+    assert results[:3] == [0, 0, 0]
+    # a token comes back every 20 seconds
+    assert 0 < results[3] <= 20
+    assert other == 0
+
+
+def test_sqlite_counters_are_shared(tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    # two backends on the same file behave like two worker processes
+    first, second = RateLimiter(SQLiteBackend(path)), RateLimiter(SQLiteBackend(path))
+
+    async def run():
+        return [await first.hit("k", "2/minute"), await second.hit("k", "2/minute"), await first.hit("k", "2/minute")]
+
+    assert asyncio.run(run())[2] > 0
+
+
+def test_sqlite_prunes_full_buckets(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "ratelimit.db"))
+    backend.PRUNE_EVERY = 3
+
+    async def run():
+        # a tat already in the past, as left behind by a client that went away
+        await backend.hit("gone", -60, 60)
+        await backend.hit("live", 60, 120)
+        await backend.hit("live", 60, 120)
+
+    asyncio.run(run())
+    keys = [key for (key,) in backend._connection().execute("SELECT key FROM rate_limits")]
+    assert keys == ["live"]
+
+
+def test_sqlite_lets_requests_through_while_locked(tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    backend = SQLiteBackend(path)
+    # another worker holds the write lock for longer than the busy timeout
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        assert asyncio.run(backend.hit("k", 60, 0)) == 0
+    finally:
+        other.rollback()
+        other.close()
+    assert asyncio.run(backend.hit("k", 60, 60)) == 0
+    assert asyncio.run(backend.hit("k", 60, 60)) > 0
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import update
+
+from auth.utils import generate_token
+from database.database import sessionLocal
+from models.models import RefreshToken
+
+
+@pytest.fixture
+def app_users():
+    return [{"username": "session", "email": "session@example.com", "password": "secret123", "is_verified": True}]
+
+
+def _login(client) -> dict:
+    response = client.post("/login", data={"username": "session", "password": "secret123"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def _refresh(client, refresh_token: str):
+    return client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_rotates_the_token(client):
+    first = _login(client)["refresh_token"]
+
+    response = _refresh(client, first)
+    assert response.status_code == 200
+    tokens = response.json()
+    assert tokens["refresh_token"] != first
+    assert client.get("/protected", headers={"Authorization": f"Bearer {tokens['access_token']}"}).status_code == 200
+
+    assert _refresh(client, tokens["refresh_token"]).status_code == 200
+
+
+def test_reusing_a_rotated_token_revokes_the_family(client):
+    first = _login(client)["refresh_token"]
+    latest = _refresh(client, first).json()["refresh_token"]
+    other_login = _login(client)["refresh_token"]
+
+    # the rotated token is presented again, whoever holds the latest one loses it too
+    assert _refresh(client, first).status_code == 401
+    assert _refresh(client, latest).status_code == 401
+    assert _refresh(client, other_login).status_code == 200
+
+
+def test_expired_token_is_rejected(client):
+    refresh_token = _login(client)["refresh_token"]
+    with sessionLocal() as db:
+        db.execute(update(RefreshToken).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+        db.commit()
+
+    assert _refresh(client, refresh_token).status_code == 401
+
+
+def test_logout_revokes_the_refresh_tokens_of_the_login(client):
+    tokens = _login(client)
+    rotated = _refresh(client, tokens["refresh_token"]).json()
+    other_login = _login(client)["refresh_token"]
+
+    response = client.post("/logout", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert response.status_code == 200
+
+    assert _refresh(client, rotated["refresh_token"]).status_code == 401
+    assert _refresh(client, other_login).status_code == 200
+
+
+def test_password_reset_revokes_every_refresh_token(client):
+    refresh_tokens = [_login(client)["refresh_token"] for _ in range(2)]
+
+    response = client.post(
+        "/reset-password",
+        params={"reset_token": generate_token("session@example.com")},
+        json={"new_password": "newsecret123", "confirm_password": "newsecret123"}
+    )
+    assert response.status_code == 200
+
+    for refresh_token in refresh_tokens:
+        assert _refresh(client, refresh_token).status_code == 401
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+
+from database.replicas import ReplicaSet
+from services.metrics import db_queries
+
+
+def test_round_robin_skips_replicas_marked_down():
+    replicas = ReplicaSet(["sqlite:///:memory:", "sqlite:///:memory:", "sqlite:///:memory:"])
+    first, second, third = replicas.replicas
+    assert [replicas.pick() for _ in range(3)] == [first, second, third]
+
+    second.mark_down("test")
+    assert [replicas.pick() for _ in range(4)] == [first, third, first, third]
+
+    first.mark_down("test")
+    third.mark_down("test")
+    assert replicas.pick() is None  # reads fall back to the primary
+
+
+def test_replica_statements_are_recorded_in_the_metrics():
+    replicas = ReplicaSet(["sqlite:///:memory:"])
+    before = db_queries._series.get(("replica", "SELECT"), [None, 0])[0]
+    with replicas.replicas[0].engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    counts = db_queries._series[("replica", "SELECT")][0]
+    assert sum(counts) == sum(before or ()) + 1
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+from sqlalchemy import select
+
+from auth.oauth2 import principal_cache
+from auth.revocation import RevocationStore
+from auth.utils import generate_token
+from config import Config
+from database.database import sessionLocal
+from models.models import RevokedToken
+
+
+def test_revoked_until_expiry():
+    store = RevocationStore()
+    store.add("live", time.time() + 60)
+    store.add("expired", time.time() - 1)
+    assert store.is_revoked("live")
+    assert not store.is_revoked("unknown")
+    assert not store.is_revoked(None)
+
+    store.sweep()
+    assert len(store) == 1
+    assert not store.is_revoked("expired")
+
+
+@pytest.fixture
+def app_users():
+    return [
+        {"username": "owner", "email": "owner@example.com", "password": "secret123", "is_verified": True},
+        {"username": "root", "email": "root@example.com", "password": "secret123", "is_verified": True, "role": "admin"},
+    ]
+
+
+def _bearer(client, username: str) -> dict:
+    token = client.post("/login", data={"username": username, "password": "secret123"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_revoked_by_is_who_revoked_the_token(client):
+    assert client.post("/logout", headers=_bearer(client, "owner")).status_code == 200
+    assert client.post("/admin/revoke", json={"jti": "some-jti"}, headers=_bearer(client, "root")).status_code == 200
+
+    with sessionLocal() as db:
+        rows = dict(db.execute(select(RevokedToken.jti, RevokedToken.revoked_by)).all())
+    assert rows.pop("some-jti") == "root"
+    assert list(rows.values()) == ["owner"]
+
+
+def test_stateless_worker_with_a_cold_cache_rejects_a_revoked_token(client, monkeypatch):
+    monkeypatch.setattr(Config, "AUTH_STATELESS", True)
+    headers = _bearer(client, "owner")
+    assert client.get("/protected", headers=headers).status_code == 200
+
+    response = client.post(
+        "/reset-password",
+        params={"reset_token": generate_token("owner@example.com")},
+        json={"new_password": "newsecret123", "confirm_password": "newsecret123"}
+    )
+    assert response.status_code == 200
+    # another worker, or this one after a restart, never saw the version bump
+    principal_cache.clear()
+
+    assert client.get("/protected", headers=headers).status_code == 401
+    assert client.get("/all_users", headers=headers).status_code == 401
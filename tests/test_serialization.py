@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, insert, select
+
+from database.database import Base
+from models.models import User
+from routers.auth_routes import USER_RESPONSE_COLUMNS
+from schemas import serialization
+from schemas.schemas import Token, user_list_adapter
+
+
+@pytest.fixture(scope="module")
+def rows():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"username": "ada", "email": "ada@example.com", "password": "x", "is_verified": True, "role": "user",
+             "created_at": datetime(2024, 5, 1, 12, 30, 5, 123456)},
+            {"username": "bob", "email": "bob@example.com", "password": "x", "is_verified": False, "role": "admin",
+             "created_at": datetime(2024, 5, 2)},
+        ])
+        yield conn.execute(select(*USER_RESPONSE_COLUMNS).order_by(User.id)).all()
+
+
+def pydantic_json(rows) -> bytes:
+    return user_list_adapter.dump_json(user_list_adapter.validate_python(rows, from_attributes=True))
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_user_rows_match_the_pydantic_output(rows, use_orjson, monkeypatch):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    assert serialization.dump_user_rows(rows) == pydantic_json(rows)
+    assert serialization.dump_user_rows_ndjson(rows) == b"".join(
+        user_list_adapter.dump_json(user_list_adapter.validate_python([row], from_attributes=True))[1:-1] + b"\n"
+        for row in rows
+    )
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_writes_utc_like_pydantic(use_orjson, monkeypatch):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, "orjson", None)
+    token = Token(access_token="a", token_type="bearer")
+    when = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert serialization.dumps({"at": when}) == b'{"at":"' + when.isoformat().replace("+00:00", "Z").encode() + b'"}'
+    assert serialization.dumps(token.model_dump()) == token.model_dump_json().encode()
@@ -0,0 +1,31 @@
+from cli.serve import hash_workers, pool_sizes, reset_after_fork
+from config import Config
+from services import login_throttle, ratelimit
+from services.ratelimit import SQLiteBackend
+
+
+def test_connection_budget_is_split_between_workers(monkeypatch):
+    monkeypatch.setattr(Config, "DB_POOL_SIZE", 5)
+    assert pool_sizes(40, 4) == (5, 5)
+    assert pool_sizes(12, 4) == (3, 0)
+    # never below one connection per worker
+    assert pool_sizes(2, 4) == (1, 0)
+
+
+def test_hashing_processes_are_split_between_workers(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 8)
+    assert hash_workers(1) == 8
+    assert hash_workers(3) == 2
+    assert hash_workers(16) == 1
+
+
+def test_forked_worker_drops_the_sqlite_backend_connections(monkeypatch, tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "ratelimit.db"))
+    monkeypatch.setattr(ratelimit.limiter, "backend", backend)
+    monkeypatch.setattr(login_throttle.login_throttle, "backend", backend)
+    # nothing stays connected after the tables are created
+    assert getattr(backend._local, "conn", None) is None
+
+    parent = backend._connection()
+    reset_after_fork()
+    assert backend._connection() is not parent
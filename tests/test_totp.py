@@ -0,0 +1,24 @@
+from auth.totp import TwoFactorAuth, qr_cache
+
+
+def test_qr_code_is_rendered_once_per_secret():
+    secret = TwoFactorAuth.generate_secret_key()
+    first = TwoFactorAuth.generate_qr_code("alice", secret)
+    hits = qr_cache.hits
+    assert TwoFactorAuth.generate_qr_code("alice", secret) == first
+    assert qr_cache.hits == hits + 1
+    assert first.startswith(b"\x89PNG")
+
+
+def test_qr_cache_never_holds_the_secret():
+    secret = TwoFactorAuth.generate_secret_key()
+    TwoFactorAuth.generate_qr_code("bob", secret, image_format="svg")
+    assert all(secret not in key for key in qr_cache._data)
+
+    TwoFactorAuth.forget_qr_codes("bob", secret)
+    assert not [key for key in qr_cache._data if key[0] == "bob"]
+
+
+def test_svg_output():
+    svg = TwoFactorAuth.generate_qr_code("alice", TwoFactorAuth.generate_secret_key(), image_format="svg")
+    assert b"<svg" in svg